@@ -1,74 +1,303 @@
-from fastapi import APIRouter, HTTPException,Depends
-from models.schemas import QueryRequest, QueryResponse, DetailedAnswer
-from services.document_loader import load_document
+from fastapi import APIRouter, HTTPException,Depends, Request
+from fastapi.responses import StreamingResponse
+from models.schemas import QueryRequest, QueryResponse, JobStatus
+from services.document_cache import document_cache
 from services.llm_extractor import extract_structured_data
-from services.embedding_search import search_embeddings
+from services.embedding_search import create_engine
+from services.index_registry import index_registry, passage_registry
+from services.bm25_index import iter_passages, split_passages
+from services.page_segment import temp_segment_path, write_segment
+from services.pipeline import stream_query, answer_tasks, as_completed_events, merge_events
+from services.shards import Shard, scatter_gather, source_name, MAX_DOCUMENTS
 from services.clause_matcher import match_clauses
-from services.logic_evaluator import evaluate_logic
+from services.http_client import download_stats
+from services.rate_limiter import current_owner
+from services.llm_gateway import llm_gateway
+from services.job_queue import JobQueue, QueueFullError
+from services.metrics import FALLBACKS, request_memory, request_peak_mb, request_timings, timed
 from utils.auth import verify_token
+from typing import AsyncIterator, Iterable, List, Optional
 import asyncio
+import json
 import logging
+import os
+import re
+import time
+import uuid
 
 router = APIRouter()
 
-@router.post("/hackrx/run", response_model=QueryResponse)
-async def run_query(request: QueryRequest, auth=Depends(verify_token)):
+SENTENCE_RE = re.compile(r"[^.]+")
+
+def first_sentences(pages: Iterable[Optional[str]], limit: int = 10) -> List[str]:
+    """The first `limit` sentences over 20 characters, read page by page"""
+    clauses = []
+    for page_text in pages:
+        for match in SENTENCE_RE.finditer(page_text or ""):
+            sentence = match.group().strip()
+            if len(sentence) > 20:
+                clauses.append(sentence)
+                if len(clauses) == limit:
+                    return clauses
+    return clauses
+
+async def get_structured_data(doc_text: Optional[str], pages: Optional[list] = None,
+                              known: Optional[dict] = None) -> tuple[dict, bool]:
+    """Extract clauses with the LLM; the flag is False when a fallback was used.
+
+    `known` holds chunk clauses of the previous version of the document, see
+    extract_structured_data. Large documents pass their pages and no text.
+    """
     try:
-        # Step 1: Load and process document
-        doc_text = await load_document(request.documents)
-        if not doc_text or len(doc_text.strip()) < 50:
-            raise ValueError("Document appears to be empty or too short")
-        
-        # Step 2: Extract structured data
-        try:
-            structured_data = await extract_structured_data(doc_text)
-            #checking if clauses were extracted
-            if not structured_data.get("clauses"):
-                print("No clauses extracted, using fallback extraction")
-                #fallback:splitting document into sentences
-                sentences = doc_text.split('.')
-                clauses = [s.strip() for s in sentences if len(s.strip()) > 20][:10]
-                structured_data = {"clauses": clauses, "entities": [], "sections": []}
+        structured_data = await extract_structured_data(doc_text, pages, known)
+        #checking if clauses were extracted
+        if structured_data.get("clauses"):
+            return structured_data, True
+        logging.warning("No clauses extracted, using fallback extraction")
+        FALLBACKS.inc("extraction")
+        #fallback:splitting document into sentences
+        clauses = first_sentences(pages if pages is not None else [doc_text])
+        return {"clauses": clauses, "entities": [], "sections": []}, False
 
-        except Exception as e:
-            print(f"LLM extraction failed: {e}, using simple fallback")
-            #emergency fallback
-            sentences= doc_text.split('.')
-            clauses=[s.strip() for s in sentences if len(s.strip()) > 20][:10]
-            structured_data = {"clauses": clauses, "entities": [],"sections": []}
-        
-        if not structured_data.get("clauses"):
-            raise ValueError("No valid clauses extracted from the document")
-        
-        # Step 3: Search embeddings
-        matches = search_embeddings(structured_data, request.questions)
-        
-        # Step 4: Match clauses with similarity scores
-        matched_clauses = match_clauses(matches, request.questions)
-        
-        # Step 5: Evaluate logic with delays to avoid rate limits
-        answers = []
-        for i, (question, clauses) in enumerate(zip(request.questions, matched_clauses)):
+    except Exception as e:
+        logging.warning(f"LLM extraction failed: {e}, using simple fallback")
+        FALLBACKS.inc("extraction")
+        #emergency fallback
+        clauses = first_sentences(pages if pages is not None else [doc_text])
+        return {"clauses": clauses, "entities": [],"sections": []}, False
+
+def get_passage_data(document) -> tuple[dict, object]:
+    """Whole-document passages and their BM25 index, built without the LLM.
+
+    Large documents are split from their page segment into a passage
+    segment, so neither the text nor the passages are held in memory.
+    """
+    engine = passage_registry.get(document.content_hash)
+    if engine is None:
+        previous = document.previous.content_hash if document.previous else None
+        if document.segment is None:
+            engine = passage_registry.add(document.content_hash, split_passages(document.text), previous)
+        else:
+            passages = write_segment(temp_segment_path(), iter_passages(document.segment))
             try:
-                answer, rationale = await evaluate_logic(question, clauses)
-                answers.append(answer)
-                
-                # Add delay between questions to avoid rate limits
-                if i < len(request.questions) - 1:
-                    await asyncio.sleep(3)
-                    
-            except Exception as e:
-                logging.error(f"Error evaluating question '{question}': {e}")
-                answers.append(f"Unable to process: {str(e)}")
-        
-        return QueryResponse(answers=answers)
-        
+                engine = passage_registry.add(document.content_hash, passages, previous)
+            finally:
+                # The index keeps its mapping; the file goes once that is released
+                os.remove(passages.path)
+    return {"clauses": engine.texts, "entities": [], "sections": []}, engine
+
+async def shard_events(position: int, url: str, retrieval: str, start: float) -> AsyncIterator[dict]:
+    """Load one document and build its index, ending with a "shard" event"""
+    # Step 1: Load and process document (served from cache when unchanged)
+    document = None
+    async for stage, value in document_cache.load_stages(url):
+        if stage == "downloaded":
+            yield {"event": "downloaded", "document": position, **value,
+                   "elapsed": time.perf_counter() - start}
+        else:
+            document = value
+    if document.chars < 50:
+        raise ValueError("Document appears to be empty or too short")
+    yield {"event": "parsed", "document": position, "chars": document.chars,
+           "cached": document.from_cache, "elapsed": time.perf_counter() - start}
+
+    # Step 2: Extract structured data, reusing cached clauses and index
+    engine = None
+    if retrieval == "passages":
+        structured_data, engine = await asyncio.to_thread(get_passage_data, document)
+    elif document.clauses:
+        structured_data = {"clauses": document.clauses, "entities": [], "sections": []}
+        engine = await asyncio.to_thread(index_registry.get_or_build, document.content_hash, document.clauses)
+    else:
+        # A new version of a known URL only sends its changed chunks to the LLM
+        previous = document.previous
+        known = previous.chunk_clauses if previous is not None else None
+        with timed("extract"):
+            structured_data, extracted = await get_structured_data(document.text, document.page_texts(), known)
+        if extracted:
+            # Only cache LLM output, fallbacks should be retried next time
+            document.clauses = structured_data["clauses"]
+            document.chunk_clauses = structured_data.get("chunks")
+            # Pickling the entry and fitting the index would stall every other stream
+            await asyncio.to_thread(document_cache.put_entry, document)
+            engine = await asyncio.to_thread(index_registry.add, document.content_hash, document.clauses,
+                                             previous.content_hash if previous is not None else None)
+    # The old version is no longer needed once this one is indexed
+    document.previous = None
+
+    if not structured_data.get("clauses"):
+        raise ValueError("No valid clauses extracted from the document")
+    if engine is None:
+        # Fallback clauses get a throwaway index, not a registry entry
+        with timed("index"):
+            engine = create_engine()
+            engine.build_index(structured_data["clauses"])
+    yield {"event": "shard", "document": position,
+           "shard": Shard(source_name(url), engine, document.content_hash)}
+
+async def tolerate_errors(position: int, events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Report a failed document as an "error" event instead of failing the query"""
+    try:
+        async for event in events:
+            yield event
+    except Exception as e:
+        logging.error(f"Document {position} failed: {e}")
+        yield {"event": "error", "document": position, "message": str(e)}
+
+async def query_events(request: QueryRequest) -> AsyncIterator[dict]:
+    """Run the query pipeline, yielding progress events and one event per answer.
+
+    Several documents are loaded concurrently, each into its own shard, and
+    searched scatter-gather with one global top-k per question.
+    """
+    urls = request.document_urls
+    if not urls:
+        raise ValueError("No documents given")
+    if len(urls) > MAX_DOCUMENTS:
+        raise ValueError(f"At most {MAX_DOCUMENTS} documents per query")
+    retrieval = request.retrieval
+    if retrieval == "streaming":
+        if len(urls) == 1:
+            async for event in stream_query(urls[0], request.questions, request.mode):
+                yield event
+            return
+        # Early answers need a single index; search whole-document passages instead
+        retrieval = "passages"
+
+    start = time.perf_counter()
+    multi = len(urls) > 1
+    generators = [shard_events(i, url, retrieval, start) for i, url in enumerate(urls)]
+    if multi:
+        # One unreadable document should not sink the others
+        generators = [tolerate_errors(i, g) for i, g in enumerate(generators)]
+    shards = []
+    errors = []
+    async for event in merge_events(generators):
+        if event["event"] == "shard":
+            shards.append(event["shard"])
+            continue
+        if event["event"] == "error":
+            errors.append(event["message"])
+        yield event
+    if not shards:
+        raise ValueError(f"No document could be loaded: {errors[0] if errors else 'unknown error'}")
+
+    # Step 3: Search every shard and merge the results
+    with timed("search"):
+        matches, scores, sources = scatter_gather(shards, request.questions)
+    yield {"event": "indexed", "clauses": sum(len(shard.texts) for shard in shards),
+           "documents": len(shards), "elapsed": time.perf_counter() - start}
+
+    # Step 4: Match clauses with similarity scores
+    with timed("match"):
+        matched_clauses = match_clauses(matches, request.questions, scores,
+                                        sources if multi else None)
+
+    # Step 5: Answer confident questions from their clauses in fast mode, the rest in
+    # packed LLM batches, concurrently, paced by the LLM scheduler
+    tasks = answer_tasks(request.questions, matched_clauses, mode=request.mode)
+    async for event in as_completed_events(tasks):
+        yield event
+    yield {"event": "done", "elapsed": time.perf_counter() - start, "peak_rss_mb": request_peak_mb()}
+
+async def collect_answers(request: QueryRequest) -> QueryResponse:
+    """Run the pipeline to completion and return answers in question order"""
+    # Tag LLM calls from this request so the scheduler can share quota fairly
+    current_owner.set(uuid.uuid4().hex)
+    answers = [""] * len(request.questions)
+    sources = [[] for _ in request.questions]
+    async for event in query_events(request):
+        if event["event"] == "answer":
+            answers[event["index"]] = event["answer"]
+            sources[event["index"]] = event.get("sources", [])
+    if len(request.document_urls) > 1:
+        return QueryResponse(answers=answers, sources=sources)
+    return QueryResponse(answers=answers)
+
+async def run_job(payload: dict) -> list:
+    # Workers outlive the request that started them, keep its breakdown clean
+    request_timings.set(None)
+    request_memory.set(None)
+    return (await collect_answers(QueryRequest(**payload))).answers
+
+# Singleton for API usage
+job_queue = JobQueue(run_job)
+
+@router.post("/hackrx/run", response_model=QueryResponse, response_model_exclude_none=True)
+async def run_query(request: QueryRequest, auth=Depends(verify_token)):
+    try:
+        return await collect_answers(request)
+
     except Exception as e:
         logging.error(f"Error in run_query: {e}")
         error_answers = [f"Error: {str(e)}" for _ in request.questions]
         return QueryResponse(answers=error_answers)
 
+@router.post("/hackrx/run/stream")
+async def run_query_stream(request: QueryRequest, http_request: Request,
+                           format: Optional[str] = None, auth=Depends(verify_token)):
+    """Same pipeline as /hackrx/run, streaming each event as soon as it happens.
+
+    Answers carry the index of their question. Sends Server-Sent Events when
+    format=sse or the client accepts text/event-stream, NDJSON otherwise.
+    """
+    use_sse = format == "sse" or (
+        format is None and "text/event-stream" in http_request.headers.get("accept", ""))
+
+    def encode(event: dict) -> str:
+        data = json.dumps(event)
+        if use_sse:
+            return f"event: {event['event']}\ndata: {data}\n\n"
+        return data + "\n"
+
+    async def body():
+        current_owner.set(uuid.uuid4().hex)
+        try:
+            async for event in query_events(request):
+                yield encode(event)
+        except Exception as e:
+            logging.error(f"Error in run_query_stream: {e}")
+            yield encode({"event": "error", "message": str(e)})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: QueryRequest, auth=Depends(verify_token)):
+    """Queue a query and return at once; poll GET /jobs/{job_id} for the answers"""
+    try:
+        job_id = job_queue.submit(request.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    return job_queue.store.get(job_id)
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, auth=Depends(verify_token)):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str, auth=Depends(verify_token)):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return job_queue.store.get(job_id)
+
 
 @router.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "DocRetrieve API is running"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "message": "DocRetrieve API is running",
+        "downloads": download_stats.snapshot(),
+        "llm": llm_gateway.stats.snapshot(),
+        "jobs": job_queue.snapshot()
+    }
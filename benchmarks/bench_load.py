@@ -0,0 +1,180 @@
+# benchmarks/bench_load.py
+"""End-to-end load scenarios against main:app, fully offline.
+
+Each scenario starts a fresh uvicorn process (empty caches) wired to a local
+document server and a fake Groq server, drives /api/v1/hackrx/run with
+concurrent clients and reports latency percentiles, throughput and peak RSS.
+
+Usage: python -m benchmarks.bench_load [--scenario NAME ...] [--llm-latency 0.2]
+           [--rate-limit-ratio 0.0] [--retrieval clauses] [--output results.json]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.corpus import make_docx, make_pdf, make_sentences
+from benchmarks.report import peak_rss_mb, save_results, summarize
+from benchmarks.servers import DocumentServer, FakeGroqServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "bench"
+
+# name: (documents as (kind, size), questions per request, requests, concurrent clients)
+SCENARIOS = {
+    "single_large_doc": ([("pdf", 200)], 5, 3, 1),
+    "many_small_docs": ([("pdf", 3), ("docx", 120)] * 10, 5, 20, 4),
+    "many_questions": ([("pdf", 20)], 50, 3, 1),
+    "concurrent_clients": ([("pdf", 20)], 5, 64, 16),
+}
+
+
+def make_questions(count: int):
+    return [f"What is the {s.split(': The ')[1].rsplit(' is ', 1)[0]}?"
+            for s in make_sentences(count, seed=7)]
+
+
+def build_corpus(directory: str, specs):
+    """Generate one file per spec; every file has distinct content"""
+    names = []
+    for i, (kind, size) in enumerate(specs):
+        name = f"doc{i}.{kind}"
+        if kind == "pdf":
+            make_pdf(os.path.join(directory, name), size, seed=i)
+        else:
+            make_docx(os.path.join(directory, name), size, seed=i)
+        names.append(name)
+    return names
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, groq_url: str, state_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        API_KEY=API_KEY,
+        GROQ_API_KEY="bench",
+        GROQ_BASE_URL=groq_url,
+        # Let the fake server, not the production quota, set the pace
+        GROQ_MAX_CALLS="1000000",
+        GROQ_TOKENS_PER_MINUTE="1000000000",
+        LLM_CACHE_ENABLED="0",
+        DOC_CACHE_DIR=os.path.join(state_dir, "documents"),
+        INDEX_DIR=os.path.join(state_dir, "indexes"),
+        JOB_DB_PATH=os.path.join(state_dir, "jobs.sqlite3"),
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("API process exited during startup")
+        try:
+            if httpx.get(base_url + "/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API did not become ready")
+
+
+async def drive(base_url: str, urls, questions, num_requests: int, clients: int, retrieval: str):
+    latencies = []
+    errors = 0
+    counter = iter(range(num_requests))
+
+    async def client(http):
+        nonlocal errors
+        for i in counter:
+            body = {"documents": urls[i % len(urls)], "questions": questions, "retrieval": retrieval}
+            start = time.perf_counter()
+            try:
+                r = await http.post("/api/v1/hackrx/run", json=body)
+                answers = r.json().get("answers", [])
+                if r.status_code != 200 or any(a.startswith("Error") for a in answers):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600.0,
+                                 headers={"Authorization": f"Bearer {API_KEY}"}) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+        wall = time.perf_counter() - start
+    return latencies, wall, errors
+
+
+def run_scenario(name: str, args) -> dict:
+    specs, num_questions, num_requests, clients = SCENARIOS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        os.makedirs(docs_dir)
+        names = build_corpus(docs_dir, specs)
+        with DocumentServer(docs_dir) as docs, \
+                FakeGroqServer(latency=args.llm_latency, rate_limit_ratio=args.rate_limit_ratio) as groq:
+            port = free_port()
+            proc = start_app(port, groq.url, os.path.join(tmp, "state"))
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                wait_ready(base_url, proc)
+                latencies, wall, errors = asyncio.run(drive(
+                    base_url, [docs.url_for(n) for n in names], make_questions(num_questions),
+                    num_requests, clients, args.retrieval))
+                rss = peak_rss_mb(proc.pid)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+            result = {
+                "documents": len(names),
+                "questions": num_questions,
+                "clients": clients,
+                "errors": errors,
+                "wall_seconds": round(wall, 3),
+                "latency": summarize(latencies, wall),
+                "peak_rss_mb": rss,
+                "llm": groq.stats(),
+            }
+    lat = result["latency"]
+    print(f"{name:20s} p50 {lat['p50_ms']:9.1f} ms  p95 {lat['p95_ms']:9.1f} ms  "
+          f"p99 {lat['p99_ms']:9.1f} ms  {lat['rps']:7.2f} req/s  rss {result['peak_rss_mb']:7.1f} MB  "
+          f"errors {errors}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0,
+                        help="share of LLM calls answered with 429")
+    parser.add_argument("--retrieval", default="clauses", choices=["clauses", "passages", "streaming"])
+    parser.add_argument("--output", help="JSON result path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = {
+        "config": {"llm_latency": args.llm_latency, "rate_limit_ratio": args.rate_limit_ratio,
+                   "retrieval": args.retrieval},
+        "scenarios": {name: run_scenario(name, args) for name in (args.scenario or SCENARIOS)},
+    }
+    print(f"Saved {save_results('load', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
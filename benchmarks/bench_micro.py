@@ -0,0 +1,109 @@
+# benchmarks/bench_micro.py
+"""Micro-benchmarks for the CPU-bound pieces of the pipeline.
+
+Covers extract_pdf_text, DOCX reading (streaming reader against python-docx
+when that is installed), TFIDFEngine index building and batch search, and
+match_clauses, each over a few input sizes. Reports the median and best of
+several repeats and saves everything as JSON.
+
+Usage: python -m benchmarks.bench_micro [--repeat 5] [--output results.json]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import make_docx, make_pdf, make_sentences
+from benchmarks.report import peak_rss_mb, save_results
+from services.clause_matcher import match_clauses
+from services.document_loader import extract_pdf_text
+from services.docx_reader import read_docx_text
+from services.embedding_search import TFIDFEngine
+
+
+def measure(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_ms": round(statistics.median(times) * 1000, 3),
+            "best_ms": round(min(times) * 1000, 3), "repeat": repeat}
+
+
+def bench_extract_pdf(repeat: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in (10, 50, 100):
+            path = os.path.join(tmp, f"{pages}.pdf")
+            make_pdf(path, pages)
+            results[f"{pages}_pages"] = measure(lambda: extract_pdf_text(path), repeat)
+    return results
+
+
+def python_docx_text(path: str) -> str:
+    """The previous DOCX path: whole document object model, body paragraphs only"""
+    import docx
+    return "\n".join(p.text for p in docx.Document(path).paragraphs if p.text.strip())
+
+
+def bench_extract_docx(repeat: int) -> dict:
+    try:
+        import docx  # noqa: F401
+        readers = {"stream": read_docx_text, "python_docx": python_docx_text}
+    except ImportError:
+        readers = {"stream": read_docx_text}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for paragraphs in (1000, 10000, 50000):
+            path = os.path.join(tmp, f"{paragraphs}.docx")
+            make_docx(path, paragraphs, table_every=20)
+            for name, reader in readers.items():
+                results[f"{paragraphs}_paras_{name}"] = measure(lambda: reader(path), repeat)
+    return results
+
+
+def bench_tfidf(repeat: int) -> dict:
+    results = {}
+    questions = [f"What is the {s.split(': The ')[1]}" for s in make_sentences(50, seed=2)]
+    for num_clauses in (100, 1000, 10000):
+        clauses = make_sentences(num_clauses, seed=1)
+        engine = TFIDFEngine()
+        results[f"build_{num_clauses}"] = measure(lambda: engine.build_index(clauses), repeat)
+        results[f"search_{num_clauses}x50"] = measure(lambda: engine.search_batch(questions), repeat)
+    return results
+
+
+def bench_match_clauses(repeat: int) -> dict:
+    results = {}
+    engine = TFIDFEngine()
+    engine.build_index(make_sentences(1000, seed=1))
+    for num_questions in (10, 100, 1000):
+        questions = [f"What is the {s.split(': The ')[1]}" for s in make_sentences(num_questions, seed=2)]
+        indices, scores = engine.search_batch(questions)
+        matches = [[engine.texts[i] for i in row] for row in indices]
+        score_lists = [row.tolist() for row in scores]
+        results[f"{num_questions}_questions"] = measure(
+            lambda: match_clauses(matches, questions, score_lists), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON result path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in (("extract_pdf_text", bench_extract_pdf), ("extract_docx", bench_extract_docx),
+                        ("tfidf_engine", bench_tfidf), ("match_clauses", bench_match_clauses)):
+        results[name] = bench(args.repeat)
+        for case, timing in results[name].items():
+            print(f"{name:18s} {case:20s} median {timing['median_ms']:10.2f} ms  best {timing['best_ms']:10.2f} ms")
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"Saved {save_results('micro', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
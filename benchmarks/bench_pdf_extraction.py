@@ -0,0 +1,53 @@
+# benchmarks/bench_pdf_extraction.py
+"""Serial vs process-pool PDF extraction across worker counts.
+
+The parallel runs go through extract_pdf_pages_checked, the path the
+service parses PDFs with.
+
+Usage: python -m benchmarks.bench_pdf_extraction [pages]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import make_pdf
+from services import pdf_extractor
+from services.document_loader import extract_pdf_pages_checked, extract_pdf_text
+from services.page_segment import PageSegment
+
+
+def extract_parallel(path: str) -> str:
+    pages = asyncio.run(extract_pdf_pages_checked(path))
+    text = pdf_extractor.join_pages(pages)
+    if isinstance(pages, PageSegment):
+        pages.delete()
+    return text
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pdf")
+        make_pdf(path, pages)
+
+        start = time.perf_counter()
+        baseline = extract_pdf_text(path)
+        serial = time.perf_counter() - start
+        print(f"{pages} pages, serial: {serial:.2f}s")
+
+        worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+        for workers in worker_counts:
+            pdf_extractor.shutdown_executor()
+            pdf_extractor.PDF_WORKERS = workers
+            start = time.perf_counter()
+            text = extract_parallel(path)
+            elapsed = time.perf_counter() - start
+            assert text == baseline, "parallel output differs from serial"
+            print(f"workers={workers}: {elapsed:.2f}s  speedup {serial / elapsed:.2f}x")
+        pdf_extractor.shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# benchmarks/bench_search.py
+"""Per-question search + refit matching vs one batched sparse product.
+
+Usage: python -m benchmarks.bench_search [clauses]
+"""
+import sys
+import time
+
+from benchmarks.corpus import make_sentences
+from services.clause_matcher import match_clauses
+from services.embedding_search import TFIDFEngine
+
+
+def main():
+    num_clauses = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    engine = TFIDFEngine()
+    engine.build_index(make_sentences(num_clauses, seed=1))
+
+    for num_questions in (10, 100, 1000):
+        questions = [f"What is the {s.split(': The ')[1]}" for s in make_sentences(num_questions, seed=2)]
+
+        start = time.perf_counter()
+        matches = [engine.search(q) for q in questions]
+        match_clauses(matches, questions)
+        looped = time.perf_counter() - start
+
+        start = time.perf_counter()
+        indices, scores = engine.search_batch(questions)
+        matches = [[engine.texts[i] for i in row] for row in indices]
+        match_clauses(matches, questions, [row.tolist() for row in scores])
+        batched = time.perf_counter() - start
+
+        print(f"{num_questions:5d} questions: loop {looped * 1000:8.1f} ms  "
+              f"batch {batched * 1000:7.1f} ms  speedup {looped / batched:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
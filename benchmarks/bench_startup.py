@@ -0,0 +1,128 @@
+# benchmarks/bench_startup.py
+"""Import-time budget check and time-to-ready for the API process.
+
+Imports `main` in fresh interpreters and fails (exit status 1) when the
+median import time exceeds the budget or when a heavy dependency that
+should load lazily is imported at startup. With --serve it also starts
+uvicorn and measures the time until /ready turns green.
+
+Usage: python -m benchmarks.bench_startup [--budget 1.0] [--repeat 5] [--serve] [--output results.json] [--check]
+
+--check only asserts the budget (for CI) and writes no results file.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.report import save_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Must only be imported on first use or by the warm-up, never by `import main`
+LAZY_MODULES = ("sklearn", "scipy", "pdfplumber", "magic", "groq", "torch", "sentence_transformers")
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_once() -> dict:
+    """Import main in a new interpreter; total seconds, slowest modules it imports, lazy leaks"""
+    code = ("import sys, main; "
+            f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    modules = []
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        seconds = int(match.group(2)) / 1e6
+        depth = len(match.group(3))
+        if depth == 1 and match.group(4) == "main":
+            total = seconds
+        elif depth == 3:
+            # Direct imports of main (-X importtime indents by two per level)
+            modules.append((match.group(4), seconds))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return {"seconds": total, "top": modules[:8], "lazy_loaded": proc.stdout.split()}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_ready(timeout: float = 60.0) -> dict:
+    """Seconds from process start until / answers and until /ready reports warm"""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port))
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=ROOT, env=env)
+    result = {}
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                    result.setdefault("listening_s", round(time.perf_counter() - start, 3))
+                    result["ready_s"] = round(time.perf_counter() - start, 3)
+                    result["warm_up"] = json.load(response)
+                    break
+            except urllib.error.HTTPError as e:
+                # 503 while warming: the server is up, the caches are not
+                result.setdefault("listening_s", round(time.perf_counter() - start, 3))
+                e.close()
+            except OSError:
+                pass
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--budget", type=float, default=float(os.environ.get("IMPORT_BUDGET_SECONDS", 1.0)),
+                        help="maximum median seconds for `import main`")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="also measure time to /ready")
+    parser.add_argument("--output", help="JSON result path (default benchmarks/results/)")
+    parser.add_argument("--check", action="store_true", help="assert the budget only, save no results")
+    args = parser.parse_args()
+
+    runs = [import_once() for _ in range(args.repeat)]
+    median = statistics.median(run["seconds"] for run in runs)
+    leaked = sorted({name for run in runs for name in run["lazy_loaded"]})
+    print(f"import main: median {median * 1000:.1f} ms, best {min(r['seconds'] for r in runs) * 1000:.1f} ms "
+          f"(budget {args.budget * 1000:.0f} ms)")
+    for name, seconds in runs[-1]["top"]:
+        print(f"  {name:28s} {seconds * 1000:8.1f} ms")
+    results = {"import_median_s": round(median, 4), "budget_s": args.budget,
+               "top_modules": runs[-1]["top"], "lazy_loaded": leaked}
+    if args.serve:
+        results["startup"] = time_to_ready()
+        print(f"listening after {results['startup'].get('listening_s')} s, "
+              f"ready after {results['startup'].get('ready_s')} s")
+    if not args.check:
+        print(f"Saved {save_results('startup', results, args.output)}")
+
+    failed = False
+    if leaked:
+        print(f"FAIL: imported at startup, should be lazy: {', '.join(leaked)}")
+        failed = True
+    if median > args.budget:
+        print(f"FAIL: import time {median:.3f} s is over the {args.budget:.3f} s budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
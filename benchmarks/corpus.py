@@ -0,0 +1,111 @@
+# benchmarks/corpus.py
+"""Synthetic policy documents for benchmarks, generated without extra dependencies."""
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "policy insured insurer premium claim hospitalisation waiting period coverage "
+    "benefit exclusion sum deductible co-payment treatment pre-existing disease "
+    "maternity room rent ambulance cashless network provider grace renewal "
+    "endorsement schedule limit days months years expenses surgery daycare"
+).split()
+
+
+def make_sentences(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    sentences = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+        sentences.append(f"Clause {i + 1}: The " + " ".join(words) + f" is {rng.randint(1, 48)} months.")
+    return sentences
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 40, seed: int = 0):
+    """Write a plain-text PDF with `pages` pages of generated clauses"""
+    sentences = make_sentences(pages * lines_per_page, seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for p in range(pages):
+        lines = sentences[p * lines_per_page:(p + 1) * lines_per_page]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line[:110])}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_num = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_num
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def make_docx(path: str, paragraphs: int, seed: int = 0, table_every: int = 0):
+    """Write a DOCX with one generated clause per paragraph.
+
+    With `table_every`, a five-row benefit schedule table follows every that
+    many paragraphs.
+    """
+    blocks = []
+    for i, s in enumerate(make_sentences(paragraphs, seed), start=1):
+        blocks.append(f"<w:p><w:r><w:t>{escape(s)}</w:t></w:r></w:p>")
+        if table_every and i % table_every == 0:
+            rows = "".join(
+                f"<w:tr><w:tc><w:p><w:r><w:t>Benefit {i}.{r}</w:t></w:r></w:p></w:tc>"
+                f"<w:tc><w:p><w:r><w:t>Covered up to {r * 5}% of sum insured</w:t></w:r></w:p></w:tc></w:tr>"
+                for r in range(1, 6))
+            blocks.append(f"<w:tbl>{rows}</w:tbl>")
+    body = "".join(blocks)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", DOCX_RELS)
+        z.writestr("word/document.xml", document)
@@ -0,0 +1,94 @@
+# benchmarks/report.py
+"""Latency summaries, memory readings and JSON result files shared by the benchmarks."""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(latencies, wall_seconds=None) -> dict:
+    """p50/p95/p99/mean/max in milliseconds, plus throughput when wall time is given"""
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    summary = {
+        "count": int(len(values)),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+    if wall_seconds:
+        summary["rps"] = round(len(values) / wall_seconds, 3)
+    return summary
+
+
+def _proc_tree(pid: int):
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def peak_rss_mb(pid: int = None) -> float:
+    """Peak resident memory of a process and its children (e.g. PDF workers), in MB.
+
+    Reads VmHWM from /proc on Linux; elsewhere falls back to getrusage, which
+    only covers this process or its already reaped children.
+    """
+    if pid is not None and os.path.exists(f"/proc/{pid}/status"):
+        total_kb = 0
+        for p in _proc_tree(pid):
+            try:
+                with open(f"/proc/{p}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            total_kb += int(line.split()[1])
+            except OSError:
+                pass
+        return round(total_kb / 1024, 1)
+    who = resource.RUSAGE_SELF if pid is None else resource.RUSAGE_CHILDREN
+    maxrss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name: str, results: dict, path: str = None) -> str:
+    """Write results with run metadata to JSON, for comparing runs over time"""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    payload = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    return path
@@ -0,0 +1,148 @@
+# benchmarks/servers.py
+"""Local stand-ins for the document host and the Groq API, for offline benchmarks.
+
+Both run in background threads. Point the service at them with
+GROQ_BASE_URL=<FakeGroqServer.url> and document URLs from DocumentServer.url_for().
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ANSWER = "Yes, the policy covers this with a waiting period of 24 months."
+
+
+class _QuietFiles(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _Server:
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class DocumentServer(_Server):
+    """Serves files from `directory` (with Last-Modified, so revalidation works)"""
+
+    def __init__(self, directory: str):
+        super().__init__(partial(_QuietFiles, directory=directory))
+
+    def url_for(self, name: str) -> str:
+        return f"{self.url}/{name}"
+
+
+class FakeGroqServer(_Server):
+    """Groq-compatible /openai/v1/chat/completions with injected latency and 429s.
+
+    Extraction prompts get back the longer sentences of their chunk as clauses,
+    batched question prompts a JSON answer per question, and other prompts a
+    short fixed answer, so the whole pipeline runs unchanged.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, rate_limit_ratio: float = 0.0,
+                 retry_after: float = 0.5, seed: int = 0):
+        server = self
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                status, payload = server.respond(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        super().__init__(Handler)
+
+    def respond(self, body: dict):
+        with self.lock:
+            self.calls += 1
+            limited = self.rng.random() < self.rate_limit_ratio
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            if limited:
+                self.rate_limited += 1
+        if limited:
+            return 429, {"error": {
+                "message": f"Rate limit reached. Please try again in {self.retry_after}s.",
+                "type": "tokens", "code": "rate_limit_exceeded"}}
+        time.sleep(delay)
+
+        messages = body.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        if messages and "Extract" in messages[0]["content"]:
+            sentences = [s.strip() for s in re.split(r"[.!?]+", prompt) if len(s.strip()) > 30]
+            content = json.dumps({"clauses": sentences[:10]})
+        elif "Questions:" in prompt:
+            numbers = re.findall(r"^Q(\d+):", prompt, re.MULTILINE)
+            content = json.dumps({"answers": {f"Q{n}": ANSWER for n in numbers}})
+        else:
+            content = ANSWER
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": f"chatcmpl-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"calls": self.calls, "rate_limited": self.rate_limited}
+
+
+if __name__ == "__main__":
+    # Run both servers by hand: python -m benchmarks.servers <directory>
+    import sys
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    with DocumentServer(directory) as docs, FakeGroqServer() as groq:
+        print(f"documents: {docs.url}\nGROQ_BASE_URL={groq.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
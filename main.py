@@ -1,17 +1,66 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import uvicorn
-from api.endpoints import router
+import asyncio
+import logging
+import time
+from api.endpoints import router, job_queue
 from utils.auth import verify_token
+from services.http_client import close_http_client
+from services.pdf_extractor import shutdown_executor
+from services.llm_gateway import llm_gateway
+from services.rate_limiter import groq_scheduler
+from services.warmup import warm_up, mark_ready, is_ready, readiness
+from utils.prefork import is_worker
+from services.metrics import metrics, IN_FLIGHT, REQUEST_SECONDS, request_memory, request_timings, sample_rss, server_timing
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Send a Server-Timing breakdown on every response, not only when a client asks with X-Timing: 1
+TIMING_HEADER = os.environ.get("TIMING_HEADER", "0") == "1"
+# More than one forks that many workers from a warmed-up parent (see utils/prefork.py)
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 1))
+
+IN_FLIGHT.set_function(lambda: groq_scheduler.queue_depth, "llm_queued")
+IN_FLIGHT.set_function(lambda: job_queue.snapshot()["queued"], "jobs_queued")
+IN_FLIGHT.set_function(lambda: job_queue.snapshot()["running"], "jobs_running")
+
+async def warm_in_background():
+    try:
+        summary = await asyncio.to_thread(warm_up)
+    except Exception as e:
+        # Everything still loads lazily, just on the first request instead
+        logging.error(f"Warm-up failed: {e}")
+        summary = {"error": str(e)}
+    mark_ready(summary)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not is_worker():
+        # Preforked workers share the job table; the launcher did this before forking
+        job_queue.store.fail_interrupted()
+    warming = None
+    if not is_ready():
+        # Accept connections straight away; /ready turns green once warm
+        warming = asyncio.create_task(warm_in_background())
+    yield
+    if warming is not None and not warming.done():
+        warming.cancel()
+    # Release job workers, pooled connections and extraction workers on shutdown
+    await job_queue.shutdown()
+    await close_http_client()
+    await llm_gateway.close()
+    shutdown_executor()
+
 app = FastAPI(
     title="DocRetrieve API",
     description="LLM-Powered Document Intelligence System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -28,6 +77,40 @@ app.include_router(
     dependencies=[Depends(verify_token)]
 )
 
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Time every request and collect the per-stage breakdown of its work"""
+    timings = {}
+    request_timings.set(timings)
+    memory = {}
+    request_memory.set(memory)
+    sample_rss()
+    start = time.perf_counter()
+    status = 500
+    IN_FLIGHT.inc("requests")
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        IN_FLIGHT.dec("requests")
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(elapsed, route.path if route else "unmatched", str(status))
+    # Streaming responses only cover the work done before the first byte
+    if TIMING_HEADER or request.headers.get("x-timing") == "1":
+        sample_rss()
+        response.headers["Server-Timing"] = server_timing(timings, elapsed, memory.get("peak"))
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until heavy modules, models and recent indexes are loaded"""
+    return JSONResponse(readiness(), status_code=200 if is_ready() else 503)
+
 @app.get("/")
 async def root():
     return {"message": "DocRetrieve API is running", "version": "1.0.0"}
@@ -35,4 +118,12 @@ async def root():
 # Add this at the end:
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    if WEB_WORKERS > 1:
+        from utils.prefork import serve
+        logging.basicConfig(level=logging.INFO)
+        if not os.environ.get("GROQ_LIMITER_FILE"):
+            logging.warning("GROQ_LIMITER_FILE is not set, each worker gets the full Groq rate limit")
+        job_queue.store.fail_interrupted()
+        serve(app, port=port, workers=WEB_WORKERS, warm=lambda: mark_ready(warm_up()))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
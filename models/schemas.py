@@ -1,12 +1,32 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, Optional, Union
 
 class QueryRequest(BaseModel):
-    documents: str  # URL to document
+    documents: Union[str, List[str]]  # URL to document, or several to search together
     questions: List[str]
+    # "clauses": LLM clause extraction + TF-IDF; "passages": BM25 over the whole document;
+    # "streaming": passages indexed page by page, answering questions while parsing
+    retrieval: Literal["clauses", "passages", "streaming"] = "clauses"
+    # "fast": answer from the matched clauses without the LLM when confident;
+    # "accurate": always ask the LLM. Defaults to ANSWER_MODE
+    mode: Optional[Literal["fast", "accurate"]] = None
+
+    @property
+    def document_urls(self) -> List[str]:
+        return [self.documents] if isinstance(self.documents, str) else list(self.documents)
 
 class QueryResponse(BaseModel):
     answers: List[str]  # Simple string answers as required
+    # Multi-document queries only: documents each answer drew on
+    sources: Optional[List[List[str]]] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed or cancelled
+    answers: Optional[List[str]] = None
+    error: Optional[str] = None
+    created: float
+    updated: float
 
 # Internal use only
 class DetailedAnswer(BaseModel):
@@ -0,0 +1,234 @@
+# services/bm25_index.py
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Iterator, List
+import numpy as np
+
+from services.embedding_search import Retriever, load_texts, save_texts, top_k_rows
+
+PASSAGE_CHARS = int(os.environ.get("PASSAGE_CHARS", 600))
+PASSAGE_OVERLAP = int(os.environ.get("PASSAGE_OVERLAP", 150))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Same tokens as sklearn's default TfidfVectorizer pattern
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def _next_window(text: str, start: int, size: int, overlap: int):
+    """End of the passage starting at `start`, and where the next one starts"""
+    length = len(text)
+    end = min(length, start + size)
+    if end < length:
+        cut = text.rfind(" ", start + size // 2, end)
+        if cut > start:
+            end = cut
+    if end >= length:
+        return end, length
+    next_start = max(end - overlap, start + 1)
+    space = text.find(" ", next_start, end)
+    return end, (space + 1 if space != -1 else next_start)
+
+
+def split_passages(text: str, size: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP) -> List[str]:
+    """Cut the whole document into overlapping passages on word boundaries"""
+    passages = []
+    start = 0
+    while start < len(text):
+        end, start_next = _next_window(text, start, size, overlap)
+        passage = " ".join(text[start:end].split())
+        if len(passage) > 20:
+            passages.append(passage)
+        start = start_next
+    return passages
+
+
+def iter_passages(pages, size: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP) -> Iterator[str]:
+    """split_passages of the joined page texts, without joining them"""
+    splitter = PassageSplitter(size, overlap)
+    for page_text in pages:
+        if page_text:
+            yield from splitter.feed(page_text)
+    yield from splitter.flush()
+
+
+class PassageSplitter:
+    """Incremental split_passages: feed text page by page, get finished passages"""
+
+    def __init__(self, size: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP):
+        self.size = size
+        self.overlap = overlap
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text + "\n"
+        passages = []
+        # Keep enough tail that the last window is never cut short by a page break
+        while len(self.buffer) >= 2 * self.size:
+            end, next_start = _next_window(self.buffer, 0, self.size, self.overlap)
+            passage = " ".join(self.buffer[:end].split())
+            if len(passage) > 20:
+                passages.append(passage)
+            self.buffer = self.buffer[next_start:]
+        return passages
+
+    def flush(self) -> List[str]:
+        passages = split_passages(self.buffer, self.size, self.overlap)
+        self.buffer = ""
+        return passages
+
+
+def content_terms(text: str) -> set:
+    # Imported here so BM25 alone does not pull in scikit-learn at startup
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    return {t for t in tokenize(text) if t not in ENGLISH_STOP_WORDS}
+
+
+class BM25Engine(Retriever):
+    """Okapi BM25 over an inverted index kept as flat NumPy arrays.
+
+    Postings for term t are docs[ptr[t]:ptr[t+1]] with their precomputed BM25
+    weights in weights[ptr[t]:ptr[t+1]], so a query is a handful of vectorised
+    scatter-adds, with no per-document Python loop.
+    """
+    name = "bm25"
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.ptr = None
+        self.docs = None
+        self.weights = None
+        self.texts = []
+
+    def build_index(self, texts):
+        self.texts = texts
+        vocabulary = {}
+        # Typed arrays, not lists: a large document has millions of postings
+        term_ids, doc_ids, tfs = array("i"), array("i"), array("f")
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for d, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[d] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(d)
+                tfs.append(tf)
+        self.vocabulary = vocabulary
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        self.ptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_length = max(float(doc_lengths.mean()) if len(texts) else 0.0, 1.0)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_ids] / avg_length)
+        self.docs = doc_ids
+        self.weights = (idf[term_ids] * tfs * (BM25_K1 + 1) / (tfs + norm)).astype(np.float32)
+
+    def score(self, query):
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocabulary.get(term)
+            if t is not None:
+                start, end = self.ptr[t], self.ptr[t + 1]
+                scores[self.docs[start:end]] += self.weights[start:end]
+        return scores
+
+    def search_batch(self, queries, top_k=3):
+        if self.docs is None or not self.texts:
+            raise ValueError("BM25 index not built.")
+        results = [top_k_rows(self.score(q)[None, :], top_k) for q in queries]
+        indices = np.vstack([r[0] for r in results])
+        scores = np.vstack([r[1] for r in results])
+        return indices, scores
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "ptr.npy"), self.ptr)
+        np.save(os.path.join(path, "docs.npy"), self.docs)
+        np.save(os.path.join(path, "weights.npy"), self.weights)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"terms": terms}, f)
+        save_texts(path, self.texts)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        engine = cls()
+        engine.texts = load_texts(path, meta, mmap)
+        engine.vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        engine.ptr = np.load(os.path.join(path, "ptr.npy"), mmap_mode=mode)
+        engine.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode=mode)
+        engine.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode=mode)
+        return engine
+
+
+class StreamingBM25:
+    """BM25 index that grows one passage at a time while a document is parsed.
+
+    Postings hold raw term frequencies in append-only arrays; weights are
+    computed at query time from the current collection statistics, so
+    adding a passage never rewrites existing postings.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.postings = {}
+        self.doc_lengths = array("f")
+
+    def add(self, text: str):
+        d = len(self.texts)
+        self.texts.append(text)
+        tokens = tokenize(text)
+        self.doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            docs, tfs = self.postings.setdefault(term, (array("i"), array("f")))
+            docs.append(d)
+            tfs.append(tf)
+
+    def score(self, query: str) -> np.ndarray:
+        num_docs = len(self.texts)
+        scores = np.zeros(num_docs, dtype=np.float32)
+        if not num_docs:
+            return scores
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.float32)
+        avg_length = max(float(doc_lengths.mean()), 1.0)
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            docs = np.frombuffer(entry[0], dtype=np.int32)
+            tfs = np.frombuffer(entry[1], dtype=np.float32)
+            idf = np.log1p((num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[docs] / avg_length)
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 3):
+        """Top-k passage indices and scores for one query"""
+        scores = self.score(query)
+        if not len(scores):
+            return np.zeros(0, dtype=np.int64), scores
+        indices, top_scores = top_k_rows(scores[None, :], top_k)
+        return indices[0], top_scores[0]
+
+    def coverage(self, query: str, index: int) -> float:
+        """Share of the query's content words that appear in one passage"""
+        terms = content_terms(query)
+        if not terms:
+            return 0.0
+        return len(terms & content_terms(self.texts[index])) / len(terms)
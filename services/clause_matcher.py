@@ -1,13 +1,33 @@
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-def match_clauses(clauses_list, questions):
+def match_clauses(clauses_list, questions, scores_list=None, sources_list=None):
     """
     clauses_list: List[List[str]] - Each inner list contains clauses matched for a question
     questions: List[str]
+    scores_list: Optional[List[List[float]]] - Similarities from the retriever; when given
+        they are reused instead of refitting TF-IDF over each question's clauses
+    sources_list: Optional[List[List[str]]] - Document each clause came from, added to
+        the dicts as "source" (needs scores_list)
     Returns: List[List[dict]] - Each inner list contains dicts with clause and similarity score
     """
+    if scores_list is not None:
+        results = []
+        for q, (clauses, scores) in enumerate(zip(clauses_list, scores_list)):
+            matched = [
+                {"clause": clause, "similarity": float(sim)}
+                for clause, sim in zip(clauses, scores)
+            ]
+            if sources_list is not None:
+                for match, source in zip(matched, sources_list[q]):
+                    match["source"] = source
+            matched.sort(key=lambda x: x["similarity"], reverse=True)
+            results.append(matched)
+        return results
+
+    # Only this refitting path needs scikit-learn, which is slow to import
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     results = []
     for q, clauses in zip(questions, clauses_list):
         if not clauses:
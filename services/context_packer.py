@@ -0,0 +1,140 @@
+# services/context_packer.py
+import json
+import os
+import re
+from typing import Dict, List
+
+from services.tokenizer import count_tokens, trim_to_tokens
+
+# Prompt tokens allowed per batched answer call
+PACK_TOKEN_BUDGET = int(os.environ.get("PACK_TOKEN_BUDGET", 2500))
+PACK_MAX_QUESTIONS = int(os.environ.get("PACK_MAX_QUESTIONS", 8))
+# Longest a single clause may be in the prompt
+CLAUSE_TOKEN_LIMIT = int(os.environ.get("CLAUSE_TOKEN_LIMIT", 200))
+# Completion tokens reserved per question in a batch
+ANSWER_TOKENS = 160
+CLAUSES_PER_QUESTION = 3
+
+SYSTEM_PROMPT = (
+    "You answer questions about a document using only the numbered context. "
+    "Give each answer in under 100 words. Return only JSON."
+)
+
+
+class Batch:
+    """Questions answered together and the deduplicated clauses they cite"""
+
+    def __init__(self):
+        self.indices: List[int] = []      # positions in the original question list
+        self.questions: List[str] = []
+        self.refs: List[List[int]] = []   # per question, numbers into self.clauses
+        self.clauses: List[str] = []
+        self._numbers: Dict[str, int] = {}
+        self.tokens = 0
+
+    def new_clauses(self, clauses: List[str]) -> List[str]:
+        return [c for c in dict.fromkeys(clauses) if c not in self._numbers]
+
+    def add(self, index: int, question: str, clauses: List[str], tokens: int):
+        refs = []
+        for clause in clauses:
+            if clause not in self._numbers:
+                self.clauses.append(clause)
+                self._numbers[clause] = len(self.clauses)
+            refs.append(self._numbers[clause])
+        self.indices.append(index)
+        self.questions.append(question)
+        self.refs.append(sorted(set(refs)))
+        self.tokens += tokens
+
+
+def _context_line(match: dict) -> str:
+    clause = trim_to_tokens(match["clause"], CLAUSE_TOKEN_LIMIT)
+    if match.get("source"):
+        clause = f"({match['source']}) {clause}"
+    return clause
+
+
+def pack_questions(questions: List[str], matched_clauses: List[List[dict]], indices: List[int] = None,
+                   budget: int = PACK_TOKEN_BUDGET, max_questions: int = PACK_MAX_QUESTIONS) -> List[Batch]:
+    """Group questions (those at `indices`, default all) into as few prompts as fit the budget.
+
+    Clauses shared between questions are sent once per prompt. Questions are
+    taken in order of their best clause, so ones drawing on the same context
+    tend to land in the same batch.
+    """
+    if indices is None:
+        indices = range(len(questions))
+    lines = {i: [_context_line(m) for m in matched_clauses[i][:CLAUSES_PER_QUESTION]] for i in indices}
+    order = sorted(indices, key=lambda i: (lines[i][0] if lines[i] else "", i))
+    overhead = count_tokens(SYSTEM_PROMPT) + 80  # instructions and JSON format line
+
+    batches = []
+    batch = None
+    for i in order:
+        question_tokens = count_tokens(questions[i]) + 8
+        if batch is not None:
+            added = sum(count_tokens(c) + 4 for c in batch.new_clauses(lines[i])) + question_tokens
+            if len(batch.indices) >= max_questions or batch.tokens + added > budget:
+                batch = None
+        if batch is None:
+            batch = Batch()
+            batch.tokens = overhead
+            batches.append(batch)
+            added = sum(count_tokens(c) + 4 for c in dict.fromkeys(lines[i])) + question_tokens
+        batch.add(i, questions[i], lines[i], added)
+    return batches
+
+
+def build_messages(batch: Batch) -> List[dict]:
+    context = "\n".join(f"[{n}] {clause}" for n, clause in enumerate(batch.clauses, start=1))
+    asked = "\n".join(
+        f"Q{k}: {question} (context {', '.join(map(str, refs)) or 'none'})"
+        for k, (question, refs) in enumerate(zip(batch.questions, batch.refs), start=1))
+    prompt = f"""Context:
+{context}
+
+Questions:
+{asked}
+
+Answer each question directly from its context. JSON format:
+{{"answers": {{"Q1": "answer", "Q2": "answer"}}}}"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def completion_budget(batch: Batch) -> int:
+    return ANSWER_TOKENS * len(batch.questions) + 40
+
+
+def parse_answers(text: str, batch: Batch) -> Dict[int, str]:
+    """Map original question positions to answers; unparseable ones are left out"""
+    answers = {}
+    json_match = re.search(r"\{.*\}", text, re.DOTALL)
+    if json_match:
+        try:
+            data = json.loads(json_match.group())
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = data.get("answers", data)
+        if isinstance(data, list):
+            data = {f"Q{k}": item for k, item in enumerate(data, start=1)}
+        if isinstance(data, dict):
+            for key, value in data.items():
+                number = re.search(r"\d+", str(key))
+                if isinstance(value, dict):
+                    value = value.get("answer")
+                if number and isinstance(value, str) and value.strip():
+                    k = int(number.group()) - 1
+                    if 0 <= k < len(batch.indices):
+                        answers[batch.indices[k]] = value.strip()
+    if not answers:
+        # Plain "Q1: ..." lines when the model ignored the JSON instruction
+        for number, value in re.findall(r"^\s*Q(\d+)\s*[:.)-]\s*(.+)$", text, re.MULTILINE):
+            k = int(number) - 1
+            if 0 <= k < len(batch.indices):
+                answers[batch.indices[k]] = value.strip()
+    return answers
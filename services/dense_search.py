@@ -0,0 +1,132 @@
+# services/dense_search.py
+import json
+import os
+import threading
+import logging
+import numpy as np
+
+from services.embedding_search import Retriever, load_texts, save_texts, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+DENSE_MODEL = os.environ.get("DENSE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "int8" (per-vector scale) or "float16"
+DENSE_VECTOR_DTYPE = os.environ.get("DENSE_VECTOR_DTYPE", "int8")
+DENSE_BATCH_SIZE = int(os.environ.get("DENSE_BATCH_SIZE", 64))
+# Index rows widened to float32 at a time while scoring, to keep the copy small
+DENSE_SEARCH_BLOCK = int(os.environ.get("DENSE_SEARCH_BLOCK", 4096))
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """Load the embedding model once per process, on CPU"""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise RuntimeError("Dense retrieval needs the sentence-transformers package")
+            logger.info(f"Loading embedding model {DENSE_MODEL}")
+            model = SentenceTransformer(DENSE_MODEL, device="cpu")
+
+            def encode(texts):
+                return model.encode(texts, batch_size=DENSE_BATCH_SIZE, convert_to_numpy=True,
+                                    normalize_embeddings=True).astype(np.float32)
+            _encoder = encode
+    return _encoder
+
+
+def quantize(vectors, dtype=DENSE_VECTOR_DTYPE):
+    """Compress unit vectors; int8 keeps one float32 scale per row"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class DenseEngine(Retriever):
+    """Exact nearest-neighbour search over quantized sentence embeddings.
+
+    Clauses are encoded in batches with a small CPU model and stored as int8
+    (or float16) arrays, a quarter (or half) of the float32 footprint.
+    Queries stay float32 and are scored with one matrix product.
+    """
+    name = "dense"
+
+    def __init__(self, encoder=None, dtype=DENSE_VECTOR_DTYPE):
+        self.encoder = encoder
+        self.dtype = dtype
+        self.vectors = None
+        self.scales = None
+        self.texts = []
+
+    def _encode(self, texts):
+        encode = self.encoder or get_encoder()
+        return encode(list(texts))
+
+    def build_index(self, texts):
+        self.texts = texts
+        self.vectors, self.scales = quantize(self._encode(texts), self.dtype)
+
+    def update_index(self, texts, previous):
+        """Only encode texts that `previous` has no vector for"""
+        if not isinstance(previous, DenseEngine) or previous.dtype != self.dtype:
+            return self.build_index(texts)
+        rows = {text: i for i, text in enumerate(previous.texts)}
+        missing = [text for text in dict.fromkeys(texts) if text not in rows]
+        logger.info(f"Reusing {len(texts) - len(missing)} of {len(texts)} embeddings")
+        if missing:
+            vectors, scales = quantize(self._encode(missing), self.dtype)
+        fresh = {text: i for i, text in enumerate(missing)}
+        self.texts = texts
+        self.vectors = np.empty((len(texts), previous.vectors.shape[1]), dtype=previous.vectors.dtype)
+        self.scales = None if previous.scales is None else np.empty(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            if text in fresh:
+                source, j = (vectors, scales), fresh[text]
+            else:
+                source, j = (previous.vectors, previous.scales), rows[text]
+            self.vectors[i] = source[0][j]
+            if self.scales is not None:
+                self.scales[i] = source[1][j]
+
+    def search_batch(self, queries, top_k=3):
+        if self.vectors is None or not self.texts:
+            raise ValueError("Dense index not built.")
+        query_vecs = self._encode(queries)
+        # Score block by block so only DENSE_SEARCH_BLOCK rows are ever widened to float32
+        sims = np.empty((len(query_vecs), len(self.vectors)), dtype=np.float32)
+        for start in range(0, len(self.vectors), DENSE_SEARCH_BLOCK):
+            block = self.vectors[start:start + DENSE_SEARCH_BLOCK]
+            np.matmul(query_vecs, block.T.astype(np.float32), out=sims[:, start:start + len(block)])
+        if self.scales is not None:
+            sims *= self.scales
+        return top_k_rows(sims, top_k)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), self.vectors)
+        if self.scales is not None:
+            np.save(os.path.join(path, "scales.npy"), self.scales)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"model": DENSE_MODEL, "dtype": self.dtype}, f)
+        save_texts(path, self.texts)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["model"] != DENSE_MODEL:
+            raise ValueError(f"Index was built with {meta['model']}, not {DENSE_MODEL}")
+        engine = cls(dtype=meta["dtype"])
+        engine.texts = load_texts(path, meta, mmap)
+        engine.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        scales_path = os.path.join(path, "scales.npy")
+        if os.path.exists(scales_path):
+            engine.scales = np.load(scales_path)
+        return engine
@@ -0,0 +1,308 @@
+# services/document_cache.py
+import asyncio
+import os
+import json
+import pickle
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from services.document_loader import download_file, extract_pages, close_payload
+from services.fingerprints import PageSpan, changed_pages, page_table
+from services.metrics import CACHE_LOOKUPS, FALLBACKS, cache_lookup
+from services.page_segment import PageSegment
+from services.pdf_extractor import join_pages
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("DOC_CACHE_DIR", os.path.join(tempfile.gettempdir(), "docretrieve_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("DOC_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+CACHE_MEMORY_ITEMS = int(os.environ.get("DOC_CACHE_MEMORY_ITEMS", 16))
+
+
+class CachedDocument:
+    """Everything derived from one document payload, keyed by its content hash.
+
+    `pages` fingerprints each page of `text` and `chunk_clauses` holds the LLM
+    clauses of each extraction chunk by fingerprint, so the next version of
+    the same URL only re-extracts what changed. `previous` is the entry this
+    version replaced, if it is still cached; it is not persisted.
+
+    Large documents keep their pages in a mapped `segment` file instead, and
+    `text` is None: read them through page_texts(), page by page.
+    """
+
+    def __init__(self, content_hash: str, text: Optional[str], clauses: Optional[List[str]] = None,
+                 pages: Optional[List[PageSpan]] = None,
+                 chunk_clauses: Optional[Dict[str, List[str]]] = None,
+                 segment: Optional[PageSegment] = None):
+        self.content_hash = content_hash
+        self.text = text
+        self.clauses = clauses
+        self.pages = pages
+        self.chunk_clauses = chunk_clauses
+        self.segment = segment
+        self.previous: Optional["CachedDocument"] = None
+        self.from_cache = False
+
+    @property
+    def chars(self) -> int:
+        """Characters of text, not counting surrounding whitespace"""
+        if self.segment is not None:
+            return self.segment.chars
+        return len(self.text.strip()) if self.text else 0
+
+    def page_texts(self) -> Optional[Sequence[str]]:
+        if self.segment is not None:
+            return self.segment
+        if self.pages is None:
+            return None
+        return [self.text[start:end] for _, start, end in self.pages]
+
+
+class DocumentCache:
+    """On-disk LRU cache of extracted text and clauses per document.
+
+    Entries are stored by SHA-256 of the downloaded bytes, so the same payload
+    behind different URLs is only processed once. A small URL table remembers the
+    ETag/Last-Modified of each URL for conditional GET revalidation, and the
+    content hash last seen there, to find the previous version of a document.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 memory_items: int = CACHE_MEMORY_ITEMS):
+        self.cache_dir = cache_dir
+        self.entries_dir = os.path.join(cache_dir, "entries")
+        self.urls_path = os.path.join(cache_dir, "urls.json")
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def _entry_path(self, content_hash: str) -> str:
+        return os.path.join(self.entries_dir, f"{content_hash}.pkl")
+
+    def _segment_path(self, content_hash: str) -> str:
+        return os.path.join(self.entries_dir, f"{content_hash}.seg")
+
+    def _read_urls(self) -> Dict[str, dict]:
+        try:
+            with open(self.urls_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_urls(self, urls: Dict[str, dict]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(urls, f)
+        os.replace(tmp_path, self.urls_path)
+
+    def _remember(self, doc: CachedDocument):
+        self._memory[doc.content_hash] = doc
+        self._memory.move_to_end(doc.content_hash)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_entry(self, content_hash: str) -> Optional[CachedDocument]:
+        """Return a cached entry and mark it as recently used"""
+        with self._lock:
+            doc = self._memory.get(content_hash)
+            if doc is not None:
+                self._memory.move_to_end(content_hash)
+                return doc
+        path = self._entry_path(content_hash)
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {content_hash}: {e}")
+            self._discard(path)
+            return None
+        segment = None
+        if data.get("segment"):
+            try:
+                segment = PageSegment(self._segment_path(content_hash))
+                os.utime(segment.path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Discarding cache entry {content_hash} without its pages: {e}")
+                self._discard(path)
+                return None
+        doc = CachedDocument(content_hash, data["text"], data.get("clauses"), data.get("pages"),
+                             data.get("chunk_clauses"), segment)
+        with self._lock:
+            self._remember(doc)
+        return doc
+
+    def warm(self, limit: int = CACHE_MEMORY_ITEMS) -> int:
+        """Read the most recently used entries into memory, returning how many"""
+        names = [name for name in os.listdir(self.entries_dir) if name.endswith(".pkl")]
+        names.sort(key=lambda name: os.stat(os.path.join(self.entries_dir, name)).st_mtime, reverse=True)
+        loaded = 0
+        for name in reversed(names[:min(limit, self.memory_items)]):
+            if self.get_entry(name[:-len(".pkl")]) is not None:
+                loaded += 1
+        return loaded
+
+    def new_entry(self, content_hash: str, pages: Sequence[Optional[str]]) -> CachedDocument:
+        """Cache freshly extracted pages; a PageSegment is moved into the cache, not copied"""
+        if isinstance(pages, PageSegment):
+            pages.move(self._segment_path(content_hash))
+            doc = CachedDocument(content_hash, None, pages=page_table(pages), segment=pages)
+        else:
+            doc = CachedDocument(content_hash, join_pages(pages), pages=page_table(pages))
+        self.put_entry(doc)
+        return doc
+
+    def put_entry(self, doc: CachedDocument):
+        """Persist an entry and evict least recently used ones over the size budget"""
+        data = {"text": doc.text, "clauses": doc.clauses, "pages": doc.pages,
+                "chunk_clauses": doc.chunk_clauses, "segment": doc.segment is not None}
+        fd, tmp_path = tempfile.mkstemp(dir=self.entries_dir)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._entry_path(doc.content_hash))
+        with self._lock:
+            self._remember(doc)
+        self.evict()
+
+    def get_validators(self, url: str) -> Optional[dict]:
+        return self._read_urls().get(url)
+
+    def put_validators(self, url: str, meta: dict):
+        with self._lock:
+            urls = self._read_urls()
+            entry = {
+                "etag": meta.get("etag"),
+                "last_modified": meta.get("last_modified"),
+                "content_hash": meta["content_hash"],
+            }
+            if urls.get(url) != entry:
+                urls[url] = entry
+                self._write_urls(urls)
+
+    def previous_version(self, url: str, content_hash: str, doc: CachedDocument) -> Optional[CachedDocument]:
+        """The cached entry `doc` replaces at `url`, with its changed pages counted"""
+        previous = self.get_entry(content_hash)
+        if previous is None or previous.pages is None:
+            return previous
+        # Keep one version of history, not a chain back to the first
+        previous.previous = None
+        changed = changed_pages(previous.pages, doc.pages)
+        CACHE_LOOKUPS.inc("page", "hit", amount=len(doc.pages) - len(changed))
+        CACHE_LOOKUPS.inc("page", "miss", amount=len(changed))
+        logger.info(f"New version of {url}: {len(changed)} of {len(doc.pages)} pages changed"
+                    f"{f' (pages {changed[:10]})' if changed else ''}")
+        return previous
+
+    def _discard(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes.
+
+        An entry's pickle and its page segment, if any, go together. Segments
+        still being written (.tmp- names) are left alone.
+        """
+        entries = {}
+        total = 0
+        for name in os.listdir(self.entries_dir):
+            if name.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.entries_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = entries.setdefault(name.split(".", 1)[0], [0.0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(path)
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for key, (_, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                self._discard(path)
+            total -= size
+            with self._lock:
+                self._memory.pop(key, None)
+            logger.info(f"Evicted cache entry {key}")
+
+    async def load_stages(self, url: str) -> AsyncIterator[tuple]:
+        """Load a document, revalidating and reusing cached work where possible.
+
+        Yields ("downloaded", info) once the download is done, before parsing
+        starts, for progress reporting, and ("document", CachedDocument) last.
+        """
+        validators = self.get_validators(url)
+        payload = None
+        try:
+            try:
+                payload, file_type, meta = await download_file(url, validators)
+            except Exception:
+                if validators:
+                    cached = self.get_entry(validators["content_hash"])
+                    if cached is not None:
+                        logger.warning(f"Revalidation of {url} failed, serving cached copy")
+                        FALLBACKS.inc("stale_document")
+                        cached.from_cache = True
+                        yield "document", cached
+                        return
+                raise
+
+            if meta["status"] == 304 and validators:
+                cached = self.get_entry(validators["content_hash"])
+                if cached is not None:
+                    logger.info(f"Cache hit for {url} (not modified)")
+                    cache_lookup("document", True)
+                    yield "downloaded", {"not_modified": True}
+                    cached.from_cache = True
+                    yield "document", cached
+                    return
+                # Entry was evicted, fetch the full body again
+                payload, file_type, meta = await download_file(url)
+
+            yield "downloaded", {"not_modified": False, "file_type": file_type}
+            content_hash = meta["content_hash"]
+            self.put_validators(url, meta)
+            cached = self.get_entry(content_hash)
+            cache_lookup("document", cached is not None)
+            if cached is not None:
+                logger.info(f"Cache hit for {url} (content {content_hash[:12]})")
+                cached.from_cache = True
+                yield "document", cached
+                return
+
+            pages = await extract_pages(payload, spill_dir=self.entries_dir)
+            try:
+                # Page hashing and pickling stay off the event loop
+                doc = await asyncio.to_thread(self.new_entry, content_hash, pages)
+            finally:
+                if isinstance(pages, PageSegment) and pages.path != self._segment_path(content_hash):
+                    pages.delete()
+            if validators and validators["content_hash"] != content_hash:
+                doc.previous = await asyncio.to_thread(self.previous_version, url, validators["content_hash"], doc)
+            yield "document", doc
+
+        except Exception as e:
+            logger.error(f"Document loading failed: {e}")
+            raise ValueError(f"Failed to load document from {url}: {str(e)}")
+
+        finally:
+            close_payload(payload)
+
+
+# Singleton for API usage
+document_cache = DocumentCache()
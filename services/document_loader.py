@@ -1,119 +1,205 @@
-import requests
-import pdfplumber
-import docx
+import io
+import mmap
 import tempfile
+import asyncio
 import os
-import mimetypes
-import magic  # You might need to install this
-from typing import Optional
+import zipfile
+import hashlib
+import time
+from typing import BinaryIO, List, Optional, Sequence, Union
 import logging
 
+from services.http_client import get_http_client, download_stats
+from services.docx_reader import blocks_to_lines, iter_docx_blocks
+from services.fingerprints import split_sections
+from services.page_segment import PageSegment, PageSpool
+from services.pdf_extractor import PDFSource, extract_page_range, iter_pdf_pages, join_pages, open_pdf
+from services.metrics import FALLBACKS, IN_FLIGHT, record_stage, timed
+
 logger = logging.getLogger(__name__)
 
-def detect_file_type(file_path: str, url: str) -> str:
-    """Detect file type using multiple methods"""
-    
-    # Method 1: Check URL extension
-    if url.lower().endswith('.pdf'):
+DOWNLOAD_MAX_BYTES = int(os.environ.get("DOWNLOAD_MAX_BYTES", 100 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Payloads above this are kept in an mmap'd temp file instead of on the heap
+DOWNLOAD_SPILL_BYTES = int(os.environ.get("DOWNLOAD_SPILL_BYTES", 32 * 1024 * 1024))
+
+class DocumentPayload:
+    """Downloaded document bytes, held in memory or in an mmap'd spill file.
+
+    Small payloads stay one bytes object. Past DOWNLOAD_SPILL_BYTES the
+    download is written to a temp file once and mapped, so large documents do
+    not sit on the heap. `source` is what the PDF extractor gets (bytes, or
+    the spill path; bytes are written to a temp file before they fan out to
+    the pool), `open()` gives an independent seekable reader for in-process
+    parsers.
+    """
+
+    def __init__(self, data, file_type: str = 'pdf', path: Optional[str] = None):
+        self.data = data
+        self.file_type = file_type
+        self.path = path
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def source(self):
+        return self.path if self.path is not None else self.data
+
+    def open(self) -> BinaryIO:
+        if self.path is None:
+            return io.BytesIO(self.data)
+        # Served from the page cache the mapping already holds
+        return open(self.path, 'rb')
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                pass  # a parser still holds a view, the mapping goes with it
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning(f"Could not remove spill file {self.path}: {e}")
+            self.path = None
+
+def close_payload(payload: Optional[DocumentPayload]):
+    """Release a payload's buffer and spill file, if there is one"""
+    if payload is not None:
+        payload.close()
+
+def detect_file_type(head: bytes, url: str) -> str:
+    """Detect file type from the first bytes of the payload, then the URL"""
+
+    # Method 1: Read file signature (magic bytes)
+    if head.startswith(b'%PDF'):
         return 'pdf'
-    elif url.lower().endswith(('.docx', '.doc')):
+    # DOCX signature (ZIP-based)
+    if head.startswith(b'PK'):
         return 'docx'
-    
-    # Method 2: Check file extension
-    _, ext = os.path.splitext(file_path)
-    if ext.lower() == '.pdf':
+    # DOC signature
+    if head.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'doc'
+
+    # Method 2: Check URL extension
+    path = url.lower().split('?', 1)[0]
+    if path.endswith('.pdf'):
         return 'pdf'
-    elif ext.lower() in ['.docx', '.doc']:
+    elif path.endswith(('.docx', '.doc')):
         return 'docx'
-    
-    # Method 3: Read file signature (magic bytes)
-    try:
-        with open(file_path, 'rb') as f:
-            header = f.read(8)
-            
-            # PDF signature
-            if header.startswith(b'%PDF'):
-                return 'pdf'
-            
-            # DOCX signature (ZIP-based)
-            if header.startswith(b'PK'):
-                return 'docx'
-                
-            # DOC signature 
-            if header.startswith(b'\xd0\xcf\x11\xe0'):
-                return 'doc'
-                
-    except Exception as e:
-        logger.warning(f"Could not read file signature: {e}")
-    
-    # Method 4: Use python-magic if available
+
+    # Method 3: Use python-magic on the same bytes
     try:
-        import magic
-        mime_type = magic.from_file(file_path, mime=True)
+        import magic  # You might need to install this
+        mime_type = magic.from_buffer(head, mime=True)
         if 'pdf' in mime_type.lower():
             return 'pdf'
         elif 'word' in mime_type.lower() or 'officedocument' in mime_type.lower():
             return 'docx'
-    except ImportError:
-        pass
     except Exception as e:
         logger.warning(f"Magic detection failed: {e}")
-    
+
     # Default fallback
     return 'pdf'
 
-def download_file(url: str) -> tuple[str, str]:
-    """Download file and return path and detected type"""
+async def download_file(url: str, validators: Optional[dict] = None) -> tuple[Optional[DocumentPayload], str, dict]:
+    """Stream a document into memory and return its payload, detected type and response metadata.
+
+    `validators` may carry the `etag`/`last_modified` of a previously seen copy;
+    they are sent as a conditional GET and a 304 comes back with payload None.
+    """
+    spill = None
+    start = time.perf_counter()
+    IN_FLIGHT.inc("downloads")
     try:
         logger.info(f"Downloading file from: {url}")
         
-        # Add headers to mimic browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Create temp file without extension first
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(response.content)
-            temp_path = tmp.name
+        headers = {}
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
         
-        # Detect file type
-        file_type = detect_file_type(temp_path, url)
-        
-        # Rename with correct extension
-        if file_type == 'pdf':
-            final_path = temp_path + '.pdf'
+        client = get_http_client()
+        async with client.stream('GET', url, headers=headers) as response:
+            meta = {
+                'status': response.status_code,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            if response.status_code == 304:
+                logger.info("Document not modified since last download")
+                download_stats.record(0, time.perf_counter() - start, not_modified=True)
+                return None, '', meta
+            response.raise_for_status()
+            
+            content_length = response.headers.get('Content-Length')
+            if content_length and int(content_length) > DOWNLOAD_MAX_BYTES:
+                raise ValueError(f"Document is {content_length} bytes, limit is {DOWNLOAD_MAX_BYTES}")
+            
+            # Collect chunks in memory, hashing as we go; spill to disk once too large
+            digest = hashlib.sha256()
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > DOWNLOAD_MAX_BYTES:
+                    raise ValueError(f"Document exceeds download limit of {DOWNLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                if spill is None and size > DOWNLOAD_SPILL_BYTES:
+                    spill = tempfile.NamedTemporaryFile(delete=False, suffix='.spill')
+                    spill.writelines(chunks)
+                    chunks = []
+                if spill is not None:
+                    spill.write(chunk)
+                else:
+                    chunks.append(chunk)
+            meta['content_hash'] = digest.hexdigest()
+
+        if spill is not None:
+            spill.close()
+            payload = DocumentPayload(None, path=spill.name)
+            if size:
+                with open(spill.name, 'rb') as f:
+                    payload.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                payload.data = b''
         else:
-            final_path = temp_path + '.docx'
-        
-        os.rename(temp_path, final_path)
+            payload = DocumentPayload(b''.join(chunks))
+        spill = None
+
+        # Detect file type once, from the bytes already in hand
+        payload.file_type = detect_file_type(bytes(payload.data[:8]), url)
         
-        logger.info(f"Downloaded {len(response.content)} bytes, detected as {file_type}")
-        return final_path, file_type
+        elapsed = time.perf_counter() - start
+        download_stats.record(size, elapsed)
+        logger.info(f"Downloaded {size} bytes in {elapsed:.2f}s, detected as {payload.file_type}"
+                    f"{' (spilled to disk)' if payload.path else ''}")
+        return payload, payload.file_type, meta
         
     except Exception as e:
+        download_stats.record_failure()
+        if spill is not None:
+            spill.close()
+            close_payload(DocumentPayload(b'', path=spill.name))
         logger.error(f"Error downloading file: {e}")
         raise
 
-def extract_pdf_text(file_path: str) -> str:
+    finally:
+        IN_FLIGHT.dec("downloads")
+        record_stage("download", time.perf_counter() - start)
+
+def extract_pdf_text(source: PDFSource) -> str:
     """Extract text from PDF with better error handling"""
     try:
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            logger.info(f"Processing PDF with {len(pdf.pages)} pages")
-            for i, page in enumerate(pdf.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                    else:
-                        logger.warning(f"No text found on page {i+1}")
-                except Exception as e:
-                    logger.warning(f"Error extracting page {i+1}: {e}")
-                    continue
+        with open_pdf(source) as pdf:
+            num_pages = len(pdf.pages)
+        logger.info(f"Processing PDF with {num_pages} pages")
+        text = join_pages(extract_page_range(source, 0, num_pages))
         
         if not text.strip():
             raise ValueError("No text could be extracted from PDF")
@@ -125,110 +211,134 @@ def extract_pdf_text(file_path: str) -> str:
         logger.error(f"Error extracting PDF text: {e}")
         raise
 
-def extract_docx_text(file_path: str) -> str:
-    """Extract text from DOCX with better error handling"""
+def extract_docx_text(source: Union[str, DocumentPayload]) -> str:
+    """Extract text from DOCX (a path or a downloaded payload), tables, headers and footers included.
+
+    Parts are streamed out of the zip and parsed incrementally (see
+    services/docx_reader.py); table rows come out as one line each.
+    """
     try:
-        logger.info(f"Processing DOCX file: {file_path}")
-        
-        # Check if file exists and has content
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        file_size = os.path.getsize(file_path)
+        if isinstance(source, str):
+            # Check if file exists and has content
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"File not found: {source}")
+            file_size = os.path.getsize(source)
+            stream = source
+            pdf_source = source
+        else:
+            file_size = source.size
+            stream = source.open()
+            pdf_source = source.source
         if file_size == 0:
             raise ValueError("File is empty")
         
-        logger.info(f"File size: {file_size} bytes")
+        logger.info(f"Processing DOCX, {file_size} bytes")
         
         # Try to open as DOCX
         try:
-            doc = docx.Document(file_path)
-            paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
+            try:
+                lines = [line for line in blocks_to_lines(iter_docx_blocks(stream)) if line.strip()]
+            finally:
+                if not isinstance(stream, str):
+                    stream.close()
             
-            if not paragraphs:
+            if not lines:
                 raise ValueError("No text content found in DOCX")
             
-            text = "\n".join(paragraphs)
+            text = "\n".join(lines)
             logger.info(f"Extracted {len(text)} characters from DOCX")
             return text
             
-        except docx.opc.exceptions.PackageNotFoundError:
+        except (zipfile.BadZipFile, KeyError):
             logger.warning("File is not a valid DOCX, trying as PDF...")
             # Try to process as PDF instead
-            return extract_pdf_text(file_path)
+            return extract_pdf_text(pdf_source)
             
     except Exception as e:
         logger.error(f"Error extracting DOCX text: {e}")
         raise
 
-def extract_text_fallback(file_path: str) -> str:
+def extract_text_fallback(source: Union[str, DocumentPayload]) -> str:
     """Fallback text extraction using different methods"""
     logger.info("Attempting fallback text extraction...")
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        data = source.data
     
-    try:
-        # Try reading as plain text
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
+    for encoding in ('utf-8', 'latin-1'):
+        # Try reading as plain text, then with a different encoding
+        try:
+            text = str(data, encoding, errors='ignore')
             if len(text.strip()) > 100:  # Reasonable text content
                 return text
-    except:
-        pass
-    
-    try:
-        # Try reading with different encoding
-        with open(file_path, 'r', encoding='latin-1', errors='ignore') as f:
-            text = f.read()
-            if len(text.strip()) > 100:
-                return text
-    except:
-        pass
+        except Exception:
+            pass
     
     raise ValueError("Could not extract text using any method")
 
-async def load_document(url: str) -> str:
-    """Main document loading function with comprehensive error handling"""
-    file_path = None
-    
+async def extract_pages(payload: DocumentPayload, spill_dir: Optional[str] = None) -> Sequence[Optional[str]]:
+    """Extract page texts based on detected type, falling back through the other parsers.
+
+    PDFs are parsed page-parallel on the process pool; the other parsers run in
+    a worker thread so the event loop stays responsive. Formats without pages
+    come back cut into sections (see services/fingerprints.py). Every attempt
+    reads the same in-memory (or mapped) payload, never the network or a temp file.
+    Large PDFs come back as a PageSegment spilled to `spill_dir` (see
+    services/page_segment.py); the caller owns the file.
+    """
+    with timed("parse"):
+        return await _extract_pages(payload, spill_dir)
+
+async def extract_pdf_pages_checked(source: PDFSource, spill_dir: Optional[str] = None) -> Sequence[Optional[str]]:
+    spool = PageSpool(spill_dir)
     try:
-        # Download file and detect type
-        file_path, file_type = download_file(url)
-        
-        # Extract text based on detected type
-        if file_type == 'pdf':
-            try:
-                return extract_pdf_text(file_path)
-            except Exception as e:
-                logger.warning(f"PDF extraction failed, trying fallback: {e}")
-                return extract_text_fallback(file_path)
-                
-        elif file_type in ['docx', 'doc']:
-            try:
-                return extract_docx_text(file_path)
-            except Exception as e:
-                logger.warning(f"DOCX extraction failed, trying as PDF: {e}")
-                try:
-                    return extract_pdf_text(file_path)
-                except Exception as e2:
-                    logger.warning(f"PDF fallback failed, trying text fallback: {e2}")
-                    return extract_text_fallback(file_path)
+        async for _, page_text in iter_pdf_pages(source):
+            spool.append(page_text)
+        pages = spool.finish()
+        if isinstance(pages, PageSegment):
+            found = pages.chars > 0
         else:
-            # Unknown type, try both
+            found = any(page_text and page_text.strip() for page_text in pages)
+        if not found:
+            raise ValueError("No text could be extracted from PDF")
+    except BaseException:
+        spool.discard()
+        raise
+    return pages
+
+async def _extract_text_sections(parse, payload: DocumentPayload) -> List[str]:
+    return split_sections(await asyncio.to_thread(parse, payload))
+
+async def _extract_pages(payload: DocumentPayload, spill_dir: Optional[str] = None) -> Sequence[Optional[str]]:
+    file_type = payload.file_type
+    if file_type == 'pdf':
+        try:
+            return await extract_pdf_pages_checked(payload.source, spill_dir)
+        except Exception as e:
+            logger.warning(f"PDF extraction failed, trying fallback: {e}")
+            FALLBACKS.inc("parser")
+            return await _extract_text_sections(extract_text_fallback, payload)
+            
+    elif file_type in ['docx', 'doc']:
+        try:
+            return await _extract_text_sections(extract_docx_text, payload)
+        except Exception as e:
+            logger.warning(f"DOCX extraction failed, trying as PDF: {e}")
+            FALLBACKS.inc("parser")
             try:
-                return extract_pdf_text(file_path)
-            except:
-                try:
-                    return extract_docx_text(file_path)
-                except:
-                    return extract_text_fallback(file_path)
-                    
-    except Exception as e:
-        logger.error(f"Document loading failed: {e}")
-        raise ValueError(f"Failed to load document from {url}: {str(e)}")
-        
-    finally:
-        # Clean up temp file
-        if file_path and os.path.exists(file_path):
+                return await extract_pdf_pages_checked(payload.source, spill_dir)
+            except Exception as e2:
+                logger.warning(f"PDF fallback failed, trying text fallback: {e2}")
+                return await _extract_text_sections(extract_text_fallback, payload)
+    else:
+        # Unknown type, try both
+        try:
+            return await extract_pdf_pages_checked(payload.source, spill_dir)
+        except Exception:
+            FALLBACKS.inc("parser")
             try:
-                os.remove(file_path)
-            except Exception as e:
-                logger.warning(f"Could not remove temp file {file_path}: {e}")
\ No newline at end of file
+                return await _extract_text_sections(extract_docx_text, payload)
+            except Exception:
+                return await _extract_text_sections(extract_text_fallback, payload)
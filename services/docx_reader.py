@@ -0,0 +1,170 @@
+# services/docx_reader.py
+import re
+import zipfile
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Union
+from xml.etree.ElementTree import iterparse
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Legacy copies of text boxes and shapes, the same text as the modern choice next to them
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+BODY_PART = "word/document.xml"
+HEADER_FOOTER_RE = re.compile(r"word/(header|footer)(\d*)\.xml$")
+
+# Run content that becomes text; everything else in a run (field codes, deleted text, drawings) is skipped
+TEXT_TAGS = {W + "t": None, W + "tab": "\t", W + "br": "\n", W + "cr": "\n",
+             W + "noBreakHyphen": "-", W + "softHyphen": ""}
+# Tracked changes whose w:t text is no longer part of the document
+SKIP_TAGS = {W + "del", W + "moveFrom"}
+
+
+class DocxBlock(NamedTuple):
+    """One paragraph or table cell and where it sits in the document.
+
+    `part` is "body", "header1", "footer2" and so on. Cells carry the index
+    of their table within the part and their row and column; nested tables
+    report the innermost one.
+    """
+    part: str
+    kind: str  # "paragraph" or "cell"
+    text: str
+    table: Optional[int] = None
+    row: Optional[int] = None
+    column: Optional[int] = None
+
+
+def _collect_text(elem, parts: List[str]):
+    for child in elem:
+        tag = child.tag
+        if tag in TEXT_TAGS:
+            value = TEXT_TAGS[tag]
+            parts.append((child.text or "") if value is None else value)
+        elif tag not in SKIP_TAGS:
+            _collect_text(child, parts)
+
+
+def _paragraph_text(p) -> str:
+    parts = []
+    _collect_text(p, parts)
+    return "".join(parts)
+
+
+def _iter_part(stream: BinaryIO, part: str) -> Iterator[DocxBlock]:
+    """Stream one WordprocessingML part, clearing each block once it is read"""
+    tables = []     # per open table: [index, row, column, cell paragraphs]
+    table_count = 0
+    container = None
+    depth = 0
+    container_depth = None
+    fallback = 0
+    for event, elem in iterparse(stream, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            tag = elem.tag
+            if tag == MC_FALLBACK:
+                fallback += 1
+            elif fallback:
+                pass
+            elif tag in (W + "body", W + "hdr", W + "ftr") and container is None:
+                container, container_depth = elem, depth
+            elif tag == W + "tbl":
+                tables.append([table_count, -1, -1, []])
+                table_count += 1
+            elif tag == W + "tr" and tables:
+                tables[-1][1] += 1
+                tables[-1][2] = -1
+            elif tag == W + "tc" and tables:
+                tables[-1][2] += 1
+                tables[-1][3] = []
+            continue
+
+        depth -= 1
+        tag = elem.tag
+        if tag == MC_FALLBACK:
+            fallback -= 1
+            elem.clear()
+        elif fallback:
+            pass
+        elif tag == W + "p":
+            text = _paragraph_text(elem)
+            elem.clear()
+            if tables and tables[-1][2] >= 0:
+                tables[-1][3].append(text)
+            elif text.strip():
+                yield DocxBlock(part, "paragraph", text)
+        elif tag == W + "tc" and tables:
+            index, row, column, paragraphs = tables[-1]
+            text = "\n".join(t for t in paragraphs if t.strip())
+            tables[-1][3] = []
+            elem.clear()
+            if text:
+                yield DocxBlock(part, "cell", text, index, row, column)
+        elif tag == W + "tr":
+            elem.clear()
+        elif tag == W + "tbl" and tables:
+            tables.pop()
+            elem.clear()
+        if container is not None and depth == container_depth:
+            # Finished a top-level block: drop it so memory stays flat
+            container.clear()
+
+
+def _part_order(name: str):
+    kind, number = HEADER_FOOTER_RE.search(name).groups()
+    return kind != "header", int(number or 0)
+
+
+def iter_docx_blocks(source: Union[str, BinaryIO]) -> Iterator[DocxBlock]:
+    """Paragraphs and table cells of a DOCX (path or seekable binary stream).
+
+    Parts are decompressed and parsed incrementally, so memory stays bounded
+    by the largest single paragraph or table row rather than the document.
+    Header text comes first and footer text last, each distinct text once.
+    Raises zipfile.BadZipFile or KeyError when the file is not a DOCX.
+    """
+    with zipfile.ZipFile(source) as archive:
+        names = archive.namelist()
+        if BODY_PART not in names:
+            raise KeyError(f"{BODY_PART} not found, not a DOCX file")
+        extra = sorted((n for n in names if HEADER_FOOTER_RE.search(n)), key=_part_order)
+        headers = [n for n in extra if "/header" in n]
+        footers = [n for n in extra if "/footer" in n]
+        seen = set()
+        for name in headers + [BODY_PART] + footers:
+            part = "body" if name == BODY_PART else name.rsplit("/", 1)[1][:-len(".xml")]
+            with archive.open(name) as stream:
+                for block in _iter_part(stream, part):
+                    if part != "body":
+                        # The same header usually repeats across first/even/default pages
+                        if block.text in seen:
+                            continue
+                        seen.add(block.text)
+                    yield block
+
+
+def blocks_to_lines(blocks: Iterator[DocxBlock]) -> Iterator[str]:
+    """One line per paragraph and per table row, cells of a row joined with " | ".
+
+    Keeping a row on one line keeps a schedule's label next to its value.
+    """
+    row_key = None
+    cells: List[str] = []
+    for block in blocks:
+        if block.kind == "cell":
+            key = (block.part, block.table, block.row)
+            if key != row_key and cells:
+                yield " | ".join(cells)
+                cells = []
+            row_key = key
+            cells.append(" ".join(block.text.split()))
+            continue
+        if cells:
+            yield " | ".join(cells)
+            cells = []
+            row_key = None
+        yield block.text
+    if cells:
+        yield " | ".join(cells)
+
+
+def read_docx_text(source: Union[str, BinaryIO]) -> str:
+    return "\n".join(blocks_to_lines(iter_docx_blocks(source)))
@@ -1,40 +1,156 @@
+import json
+import os
+import shutil
+from abc import ABC, abstractmethod
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-class TFIDFEngine:
+from services.page_segment import PageSegment, write_segment
+
+# scikit-learn and scipy take about a second to import, so the TF-IDF engine
+# imports them on first use instead of at startup (see services/warmup.py)
+
+# Retrieval engine used for clause search: "tfidf", "dense" or "bm25"
+RETRIEVER = os.environ.get("RETRIEVER", "tfidf")
+
+def top_k_rows(sims, top_k):
+    """Best `top_k` column indices and scores per row of a dense score matrix"""
+    k = min(top_k, sims.shape[1])
+    if k < sims.shape[1]:
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), sims.shape).copy()
+    top_scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+class Retriever(ABC):
+    """Interface shared by the retrieval engines.
+
+    Engines index a list of texts once and answer batched top-k queries,
+    returning (indices, scores) arrays with the best match first. `save` and
+    `load` persist an index to a directory for the index registry.
+    """
+    name = None
+
+    @abstractmethod
+    def build_index(self, texts):
+        ...
+
+    def update_index(self, texts, previous):
+        """Index `texts`, a new version of what `previous` indexed.
+
+        Engines with per-text state reuse it for texts that did not change;
+        the default refits, for engines whose weights depend on the whole
+        collection anyway.
+        """
+        self.build_index(texts)
+
+    @abstractmethod
+    def search_batch(self, queries, top_k=3):
+        ...
+
+    def search(self, query, top_k=3):
+        indices, _ = self.search_batch([query], top_k)
+        return [self.texts[i] for i in indices[0]]
+
+    @abstractmethod
+    def save(self, path):
+        ...
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path, mmap=True):
+        ...
+
+def save_texts(path, texts):
+    """Write an index's texts as a segment file next to its arrays"""
+    target = os.path.join(path, "texts.seg")
+    if isinstance(texts, PageSegment):
+        shutil.copyfile(texts.path, target)
+    else:
+        write_segment(target, texts).close()
+
+def load_texts(path, meta, mmap=True):
+    """Texts of a saved index; with mmap they are decoded on access, not loaded up front"""
+    if "texts" in meta:
+        # Saved before texts moved out of meta.json
+        return meta["texts"]
+    texts = PageSegment(os.path.join(path, "texts.seg"))
+    return texts if mmap else list(texts)
+
+class TFIDFEngine(Retriever):
+    name = "tfidf"
+
     def __init__(self):
         self.vectorizer = None
         self.matrix = None
         self.texts = []
 
     def build_index(self, texts):
+        from sklearn.feature_extraction.text import TfidfVectorizer
         self.texts = texts
         self.vectorizer = TfidfVectorizer().fit(texts)
         self.matrix = self.vectorizer.transform(texts)
 
-    def search(self, query, top_k=3):
+    def search_batch(self, queries, top_k=3):
+        """Top-k clause indices and cosine scores for all queries at once.
+
+        Returns two (len(queries), k) arrays, best match first. Rows of both
+        matrices are L2-normalised, so one sparse product gives the cosines.
+        """
         if self.matrix is None or not self.texts:
             raise ValueError("TF-IDF index not built.")
-        query_vec = self.vectorizer.transform([query])
-        sims = cosine_similarity(query_vec, self.matrix)[0]
-        top_indices = np.argsort(sims)[::-1][:top_k]
-        results = [self.texts[i] for i in top_indices]
-        return results
-
-# Singleton for API usage
-tfidf_engine = TFIDFEngine()
-
-def search_embeddings(structured_data, questions):
-    clauses = structured_data.get('clauses', [])
-    if not clauses:
-        raise ValueError("No clauses found for embedding search.")
-    tfidf_engine.build_index(clauses)
-    matches = []
-    for q in questions:
-        try:
-            matched = tfidf_engine.search(q)
-            matches.append(matched)
-        except Exception as e:
-            matches.append([f"Error: {str(e)}"])
-    return matches
\ No newline at end of file
+        query_vecs = self.vectorizer.transform(queries)
+        sims = (query_vecs @ self.matrix.T).toarray()
+        return top_k_rows(sims, top_k)
+
+    def save(self, path):
+        """Write the index as raw CSR arrays plus vocabulary, loadable with mmap"""
+        os.makedirs(path, exist_ok=True)
+        matrix = self.matrix.tocsr()
+        np.save(os.path.join(path, "data.npy"), matrix.data)
+        np.save(os.path.join(path, "indices.npy"), matrix.indices)
+        np.save(os.path.join(path, "indptr.npy"), matrix.indptr)
+        np.save(os.path.join(path, "idf.npy"), self.vectorizer.idf_)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "shape": list(matrix.shape),
+                "vocabulary": self.vectorizer.get_feature_names_out().tolist(),
+            }, f)
+        save_texts(path, self.texts)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved index; with mmap the CSR arrays are mapped, not copied"""
+        from scipy.sparse import csr_matrix
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        engine = cls()
+        engine.texts = load_texts(path, meta, mmap)
+        engine.vectorizer = TfidfVectorizer(vocabulary=meta["vocabulary"])
+        engine.vectorizer.idf_ = np.load(os.path.join(path, "idf.npy"))
+        engine.matrix = csr_matrix(
+            (np.load(os.path.join(path, "data.npy"), mmap_mode=mode),
+             np.load(os.path.join(path, "indices.npy"), mmap_mode=mode),
+             np.load(os.path.join(path, "indptr.npy"), mmap_mode=mode)),
+            shape=tuple(meta["shape"]), copy=False,
+        )
+        return engine
+
+def get_engine_class(name=None):
+    """Retriever class by name; the dense engine is imported only when asked for"""
+    name = name or RETRIEVER
+    if name == "tfidf":
+        return TFIDFEngine
+    if name == "dense":
+        from services.dense_search import DenseEngine
+        return DenseEngine
+    if name == "bm25":
+        from services.bm25_index import BM25Engine
+        return BM25Engine
+    raise ValueError(f"Unknown retriever: {name}")
+
+def create_engine(name=None):
+    return get_engine_class(name)()
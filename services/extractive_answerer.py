@@ -0,0 +1,122 @@
+# services/extractive_answerer.py
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from services.bm25_index import content_terms
+
+# "fast" answers confident questions from the matched clauses without the LLM,
+# "accurate" sends every question to the LLM; requests can override it
+ANSWER_MODE = os.environ.get("ANSWER_MODE", "accurate")
+# Lowest score an extracted sentence needs to be returned as the answer
+EXTRACTIVE_MIN_SCORE = float(os.environ.get("EXTRACTIVE_MIN_SCORE", 0.8))
+# Matched clauses searched for the answer sentence, best first
+EXTRACTIVE_TOP_CLAUSES = 3
+# Each rank further down the match list costs this much of the score
+RANK_PENALTY = 0.05
+
+# Sentence ends inside a clause. Passages are whitespace-normalised, so punctuation
+# followed by a capitalised word is the usual break; line breaks only survive in
+# LLM clauses. Table rows (cells joined by " | ") stay whole, label next to value
+SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?;])\s+(?=[\"'(\[]?[A-Z0-9])|\s*\n+\s*")
+SENTENCE_END_RE = re.compile(r"[.!?;][\"')\]]?$")
+SENTENCE_START_RE = re.compile(r"[\"'(\[]?[A-Z]")
+# What a factual answer carries: a number, an amount or a duration
+ANSWER_TOKEN_RE = re.compile(
+    r"\d+(?:[.,]\d+)*|[$€£₹%]|\b(?:rs|inr|usd|lakhs?|crores?|one|two|three|four|five|six|seven|eight|"
+    r"nine|ten|eleven|twelve|fifteen|twenty|thirty|forty|sixty|ninety|hundred|thousand|"
+    r"days?|weeks?|months?|years?|hours?)\b", re.IGNORECASE)
+# Yes/no questions want a verdict, not a quoted sentence
+YES_NO_RE = re.compile(r"^\s*(is|are|was|were|does|do|did|can|could|will|would|should|has|have|must)\b",
+                       re.IGNORECASE)
+SUFFIXES = ("ing", "ed", "es", "s")
+
+
+class Extract(NamedTuple):
+    """A sentence of one matched clause, as a span of that clause"""
+    text: str
+    score: float
+    clause: int  # position in the matches
+    start: int
+    end: int
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    return mode or ANSWER_MODE
+
+
+def _stem(term: str) -> str:
+    for suffix in SUFFIXES:
+        if len(term) > len(suffix) + 3 and term.endswith(suffix):
+            return term[:-len(suffix)]
+    return term
+
+
+def _terms(text: str) -> set:
+    return {_stem(t) for t in content_terms(text)}
+
+
+def iter_sentences(text: str):
+    """(start, end) of each whole sentence of a clause.
+
+    A passage window usually starts and ends mid-sentence, so the first piece
+    only counts when it starts like a sentence, and the last one when it ends
+    like one.
+    """
+    spans = []
+    start = 0
+    for match in SENTENCE_BREAK_RE.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+    for n, (start, end) in enumerate(spans):
+        piece = text[start:end].strip()
+        if n == 0 and not SENTENCE_START_RE.match(piece):
+            continue
+        if n == len(spans) - 1 and len(spans) > 1 and not SENTENCE_END_RE.search(piece):
+            continue
+        yield start, end
+
+
+def _answer_tokens(text: str) -> set:
+    return {token.lower() for token in ANSWER_TOKEN_RE.findall(text)}
+
+
+def extract_answer(question: str, matches: List[Dict]) -> Optional[Extract]:
+    """Best answering sentence within the top matched clauses, or None.
+
+    A sentence scores the share of the question's content words it holds,
+    less RANK_PENALTY per rank its clause sits below the best match. It must
+    also carry an answer the question does not (a number, an amount or a
+    duration), otherwise it only restates the question.
+    """
+    if YES_NO_RE.match(question):
+        return None
+    wanted = _terms(question)
+    if len(wanted) < 2:
+        return None
+    asked = _answer_tokens(question)
+    best = None
+    for rank, match in enumerate(matches[:EXTRACTIVE_TOP_CLAUSES]):
+        clause = match["clause"]
+        for start, end in iter_sentences(clause):
+            sentence = clause[start:end].strip()
+            if len(sentence) < 15:
+                continue
+            if not _answer_tokens(sentence) - asked:
+                continue
+            terms = _terms(sentence)
+            score = len(wanted & terms) / len(wanted) - RANK_PENALTY * rank
+            if best is None or score > best.score:
+                offset = clause.index(sentence, start)
+                best = Extract(sentence, score, rank, offset, offset + len(sentence))
+    return best
+
+
+def confident_answer(question: str, matches: List[Dict],
+                     min_score: float = EXTRACTIVE_MIN_SCORE) -> Optional[Extract]:
+    """extract_answer, when its score clears the threshold"""
+    extract = extract_answer(question, matches)
+    if extract is None or extract.score < min_score:
+        return None
+    return extract
@@ -0,0 +1,61 @@
+# services/fingerprints.py
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+# Target size of a section when a document has no page breaks of its own
+SECTION_CHARS = int(os.environ.get("SECTION_CHARS", 3000))
+
+# (fingerprint, start, end) of one page within the joined document text
+PageSpan = Tuple[str, int, int]
+
+
+def fingerprint(text: str) -> str:
+    """Content hash of a page, chunk or passage, ignoring whitespace changes"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:24]
+
+
+def split_sections(text: str, size: int = SECTION_CHARS) -> List[str]:
+    """Cut text without page breaks (DOCX, plain text) into page-like sections.
+
+    Sections end at line breaks chosen by the content of the line, not by
+    offset, so an edit only moves the boundaries next to it and the other
+    sections keep their fingerprints. "\\n".join(sections) gives back `text`.
+    """
+    sections = []
+    current = []
+    length = 0
+    for line in text.split("\n"):
+        current.append(line)
+        length += len(line) + 1
+        anchor = int(fingerprint(line)[:4], 16) % 4 == 0
+        if length >= 2 * size or (length >= size // 2 and anchor):
+            sections.append("\n".join(current))
+            current = []
+            length = 0
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def page_table(pages: List[Optional[str]]) -> List[PageSpan]:
+    """Fingerprint and position of every page in the text join_pages builds"""
+    table = []
+    offset = 0
+    for page_text in pages:
+        page_text = page_text or ""
+        table.append((fingerprint(page_text), offset, offset + len(page_text)))
+        if page_text:
+            offset += len(page_text) + 1
+    return table
+
+
+def changed_pages(previous: List[PageSpan], current: List[PageSpan]) -> List[int]:
+    """Numbers of the pages in `current` whose content is not in `previous`.
+
+    Pages are matched by fingerprint wherever they are, so pages that only
+    moved (after an insertion, say) do not count as changed.
+    """
+    seen = {fp for fp, _, _ in previous}
+    return [n for n, (fp, _, _) in enumerate(current, start=1) if fp not in seen]
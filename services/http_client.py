@@ -0,0 +1,77 @@
+# services/http_client.py
+import os
+import threading
+import httpx
+from typing import Optional
+
+MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", 20))
+
+try:
+    import h2  # noqa: F401  enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled async client, created on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE),
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class DownloadStats:
+    """Running byte-count and latency totals for document downloads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, num_bytes: int, seconds: float, not_modified: bool = False):
+        with self._lock:
+            self.downloads += 1
+            self.not_modified += int(not_modified)
+            self.bytes += num_bytes
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "downloads": self.downloads,
+                "not_modified": self.not_modified,
+                "failures": self.failures,
+                "bytes": self.bytes,
+                "avg_seconds": self.seconds / self.downloads if self.downloads else 0.0,
+                "max_seconds": self.max_seconds,
+            }
+
+
+download_stats = DownloadStats()
@@ -0,0 +1,146 @@
+# services/index_registry.py
+import os
+import shutil
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+
+from services.embedding_search import Retriever, get_engine_class
+from services.metrics import cache_lookup, timed
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.environ.get(
+    "INDEX_DIR", os.path.join(tempfile.gettempdir(), "docretrieve_cache", "indexes"))
+INDEX_MAX_BYTES = int(os.environ.get("INDEX_MAX_BYTES", 256 * 1024 * 1024))
+INDEX_MEMORY_ITEMS = int(os.environ.get("INDEX_MEMORY_ITEMS", 64))
+
+
+class IndexRegistry:
+    """Per-document retrieval indexes persisted on disk and shared across requests.
+
+    Each document is fitted on its own clauses, so registering a new document
+    never refits the others. Indexes are written to a temp directory and
+    renamed into place, and are immutable once published, which keeps
+    concurrent readers safe without locking the search path.
+    """
+
+    def __init__(self, root: str = INDEX_DIR, max_bytes: int = INDEX_MAX_BYTES,
+                 memory_items: int = INDEX_MEMORY_ITEMS, engine_cls=None):
+        self.engine_cls = engine_cls or get_engine_class()
+        # Each retriever keeps its own directory, their formats differ
+        self.root = os.path.join(root, self.engine_cls.name)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[Retriever]:
+        """Return the index for `key`, mapping it from disk on first use"""
+        engine = self._get(key)
+        cache_lookup(f"{self.engine_cls.name}_index", engine is not None)
+        return engine
+
+    def _get(self, key: str) -> Optional[Retriever]:
+        with self._lock:
+            engine = self._loaded.get(key)
+            if engine is not None:
+                self._loaded.move_to_end(key)
+                return engine
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            engine = self.engine_cls.load(path)
+            os.utime(path)
+        except Exception as e:
+            logger.warning(f"Could not load index {key}: {e}")
+            return None
+        self._remember(key, engine)
+        return engine
+
+    def add(self, key: str, texts: List[str], previous: Optional[str] = None) -> Retriever:
+        """Fit and publish an index for one document.
+
+        `previous` is the key of an earlier version of the same document;
+        when its index is still around the engine reuses what it can from it.
+        """
+        engine = self.engine_cls()
+        base = self._get(previous) if previous else None
+        with timed("index"):
+            if base is not None:
+                engine.update_index(texts, base)
+            else:
+                engine.build_index(texts)
+        tmp_path = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            engine.save(tmp_path)
+            os.rename(tmp_path, self._path(key))
+        except OSError:
+            # Another worker published the same document first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self._remember(key, engine)
+        self.evict()
+        return engine
+
+    def get_or_build(self, key: str, texts: List[str]) -> Retriever:
+        engine = self.get(key)
+        if engine is None:
+            engine = self.add(key, texts)
+        return engine
+
+    def warm(self, limit: int = INDEX_MEMORY_ITEMS) -> int:
+        """Load the most recently used indexes from disk, returning how many.
+
+        Done before forking workers, the loaded indexes are shared between
+        them copy-on-write instead of being loaded once per worker.
+        """
+        names = [name for name in os.listdir(self.root)
+                 if not name.startswith(".tmp-") and os.path.isdir(self._path(name))]
+        names.sort(key=lambda name: os.stat(self._path(name)).st_mtime, reverse=True)
+        loaded = 0
+        # Oldest first, so the most recent end up at the fresh end of the LRU
+        for name in reversed(names[:min(limit, self.memory_items)]):
+            if self._get(name) is not None:
+                loaded += 1
+        return loaded
+
+    def _remember(self, key: str, engine: Retriever):
+        with self._lock:
+            self._loaded[key] = engine
+            self._loaded.move_to_end(key)
+            while len(self._loaded) > self.memory_items:
+                self._loaded.popitem(last=False)
+
+    def evict(self):
+        """Remove least recently used indexes until the registry fits in max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = self._path(name)
+            if name.startswith(".tmp-") or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.stat(path).st_mtime, size, path, name))
+            total += size
+        entries.sort()
+        for _, size, path, name in entries:
+            if total <= self.max_bytes:
+                break
+            # Mapped arrays stay valid for existing readers after unlink
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self._loaded.pop(name, None)
+            logger.info(f"Evicted index {name}")
+
+
+# Singletons for API usage: LLM-extracted clauses, and whole-document passages
+index_registry = IndexRegistry()
+passage_registry = IndexRegistry(engine_cls=get_engine_class("bm25"))
@@ -0,0 +1,216 @@
+# services/job_queue.py
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", 20))
+JOB_DB_PATH = os.environ.get(
+    "JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "docretrieve_cache", "jobs.sqlite3"))
+# Finished jobs are kept this long for clients to collect
+JOB_TTL = float(os.environ.get("JOB_TTL", 24 * 3600))
+# How often a running job checks whether another process cancelled it
+JOB_CANCEL_POLL = float(os.environ.get("JOB_CANCEL_POLL", 1.0))
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class JobStore:
+    """SQLite table of jobs and their results"""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._inherited = []
+        self._connect()
+        # Preforked workers reconnect; only the parent marks interrupted jobs
+        os.register_at_fork(after_in_child=self._connect)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+            "answers TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def fail_interrupted(self) -> int:
+        """Mark jobs left queued or running by a previous run as failed.
+
+        Jobs from a previous process cannot resume. Only the process that
+        owns the store (the prefork launcher, or the single server process)
+        may call this, or it would fail jobs other workers are running.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by restart', updated = ? "
+                "WHERE status IN ('queued', 'running')", (time.time(),)).rowcount
+
+    def _connect(self):
+        if getattr(self, "_conn", None) is not None:
+            # Closing the parent's handle here could checkpoint its WAL; just stop using it
+            self._inherited.append(self._conn)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def create(self, job_id: str, request: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, request, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(request), now, now))
+            self._conn.execute(
+                f"DELETE FROM jobs WHERE updated < ? AND status IN {FINISHED}", (now - JOB_TTL,))
+
+    def update(self, job_id: str, status: str, answers=None, error: Optional[str] = None,
+               only_from: tuple = ("queued", "running")) -> bool:
+        """Move a job to `status` if it is still in one of `only_from`.
+
+        The check and the write are one statement, so a job another process
+        cancelled is never overwritten. Returns whether the job was updated.
+        """
+        placeholders = ", ".join("?" * len(only_from))
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE jobs SET status = ?, answers = ?, error = ?, updated = ? "
+                f"WHERE id = ? AND status IN ({placeholders})",
+                (status, json.dumps(answers) if answers is not None else None, error, time.time(), job_id,
+                 *only_from)).rowcount > 0
+
+    def status(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, answers, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "answers": json.loads(row[2]) if row[2] else None,
+            "error": row[3],
+            "created": row[4],
+            "updated": row[5],
+        }
+
+
+class JobQueue:
+    """Bounded in-process queue drained by a fixed number of worker tasks.
+
+    `runner` does the actual work for a job's request and returns its
+    answers. submit() raises QueueFullError instead of queueing without
+    bound, so bursts get pushed back to the client.
+    """
+
+    def __init__(self, runner: Callable[[dict], Awaitable[list]], workers: int = JOB_WORKERS,
+                 depth: int = JOB_QUEUE_DEPTH, store: Optional[JobStore] = None):
+        self.runner = runner
+        self.num_workers = workers
+        self.depth = depth
+        self.store = store or JobStore()
+        self._queue = None
+        self._workers = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled = set()
+        self._avg_seconds = 30.0
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.depth)
+            self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.num_workers)]
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up"""
+        return max(1, int(self._avg_seconds / max(self.num_workers, 1)))
+
+    def submit(self, request: dict) -> str:
+        self._ensure_workers()
+        if self._queue.full():
+            raise QueueFullError(self.retry_after())
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, request)
+        self._queue.put_nowait((job_id, request))
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it already finished.
+
+        The job may belong to another worker process: the store row is
+        what counts, and the owner notices it within JOB_CANCEL_POLL.
+        """
+        if not self.store.update(job_id, "cancelled"):
+            return False
+        self._cancelled.add(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return True
+
+    async def _run(self, job_id: str, task: asyncio.Task):
+        """Wait for a job, cancelling it if its row was cancelled elsewhere"""
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOB_CANCEL_POLL)
+            if done:
+                return task.result()
+            if self.store.status(job_id) == "cancelled":
+                self._cancelled.add(job_id)
+                task.cancel()
+
+    async def _work(self):
+        # shutdown() drops self._queue before this task sees its cancellation
+        queue = self._queue
+        while True:
+            job_id, request = await queue.get()
+            try:
+                if job_id in self._cancelled or not self.store.update(job_id, "running", only_from=("queued",)):
+                    continue
+                start = time.perf_counter()
+                task = asyncio.ensure_future(self.runner(request))
+                self._running[job_id] = task
+                try:
+                    answers = await self._run(job_id, task)
+                    self.store.update(job_id, "succeeded", answers=answers, only_from=("running",))
+                except asyncio.CancelledError:
+                    if job_id not in self._cancelled:
+                        task.cancel()
+                        raise  # the worker itself is shutting down
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed: {e}")
+                    self.store.update(job_id, "failed", error=str(e), only_from=("running",))
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.perf_counter() - start)
+            finally:
+                self._running.pop(job_id, None)
+                self._cancelled.discard(job_id)
+                queue.task_done()
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+            "workers": self.num_workers,
+            "queue_depth": self.depth,
+        }
+
+    async def shutdown(self):
+        for task in list(self._running.values()) + self._workers:
+            task.cancel()
+        self._workers = []
+        self._queue = None
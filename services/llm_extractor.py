@@ -1,74 +1,107 @@
 # SOLUTION 2: Updated llm_extractor.py with rate limiting
-import os
-from groq import Groq
 import json
+import logging
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import asyncio
-from services.rate_limiter import groq_call_with_retry
+from services.fingerprints import fingerprint
+from services.llm_gateway import llm_gateway
+from services.metrics import cache_lookup
+from services.rate_limiter import PRIORITY_EXTRACTION
 
 load_dotenv() 
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
 
-async def extract_structured_data(document_text: str) -> Dict:
-    """Extract structured data with rate limiting"""
+logger = logging.getLogger(__name__)
+
+# Much more aggressive chunking to reduce token usage
+MAX_CHUNK_SIZE = 1500  # Reduced from 3000
+# Limit to first 3 chunks to avoid rate limits
+MAX_CHUNKS = 3
+
+def split_chunks(pages: List[str]) -> List[str]:
+    """Cut pages into extraction chunks that never straddle a page break,
+    so an edited page leaves the chunks of every other page unchanged"""
+    chunks = []
+    for page_text in pages:
+        if not page_text or not page_text.strip():
+            continue
+        if len(page_text) > MAX_CHUNK_SIZE:
+            chunks.extend(page_text[i:i+MAX_CHUNK_SIZE]
+                          for i in range(0, len(page_text), MAX_CHUNK_SIZE-100))
+        else:
+            chunks.append(page_text)
+        if len(chunks) >= MAX_CHUNKS:
+            break
+    return chunks[:MAX_CHUNKS]
+
+async def extract_structured_data(document_text: Optional[str], pages: Optional[List[str]] = None,
+                                  known: Optional[Dict[str, List[str]]] = None) -> Dict:
+    """Extract structured data with rate limiting.
+
+    `pages` are the page texts of `document_text` when known. `known` maps chunk
+    fingerprints to clauses extracted from an earlier version of the document;
+    those chunks are not sent to the LLM again. The result's "chunks" maps the
+    fingerprint of every chunk the LLM answered for to its clauses.
+    """
+    chunks = split_chunks(pages if pages is not None else [document_text])
+    known = known or {}
+    fingerprints = [fingerprint(chunk) for chunk in chunks]
+
+    async def chunk_clauses(i: int, chunk: str) -> Tuple[List[str], bool]:
+        reused = known.get(fingerprints[i])
+        cache_lookup("extract_chunk", reused is not None)
+        if reused is not None:
+            return reused, True
+        return await extract_chunk_clauses(i, chunk)
+
+    results = await asyncio.gather(*(chunk_clauses(i, chunk) for i, chunk in enumerate(chunks)))
+    all_clauses = [clause for clauses, _ in results for clause in clauses]
     
-    # Much more aggressive chunking to reduce token usage
-    max_chunk_size = 1500  # Reduced from 3000
-    if len(document_text) > max_chunk_size:
-        chunks = [document_text[i:i+max_chunk_size] 
-                 for i in range(0, len(document_text), max_chunk_size-100)]
-        # Limit to first 3 chunks to avoid rate limits
-        chunks = chunks[:3]
-    else:
-        chunks = [document_text]
+    return {
+        "clauses": list(dict.fromkeys(all_clauses))[:20],  # Limit total clauses
+        "entities": [],
+        "sections": [],
+        # Fallback clauses are left out so they are retried next time
+        "chunks": {fp: clauses for fp, (clauses, ok) in zip(fingerprints, results) if ok},
+    }
+
+async def extract_chunk_clauses(i: int, chunk: str) -> Tuple[List[str], bool]:
+    """Extract clauses from one chunk, falling back to sentence splitting.
+
+    Also returns whether the LLM produced them (False for fallbacks).
+    """
+    # Simplified prompt to use fewer tokens
+    prompt = f"""Extract key clauses from this text. Return only JSON:
     
-    all_clauses = []
+    {chunk}
     
-    for i, chunk in enumerate(chunks):
-        # Simplified prompt to use fewer tokens
-        prompt = f"""Extract key clauses from this text. Return only JSON:
+    JSON format:
+    {{"clauses": ["clause1", "clause2"]}}"""
+    
+    try:
+        messages = [
+            {"role": "system", "content": "Extract clauses. Return only JSON."},
+            {"role": "user", "content": prompt}
+        ]
         
-        {chunk[:1000]}...
+        result_text = await llm_gateway.complete(messages, max_retries=2,
+                                                 priority=PRIORITY_EXTRACTION)
         
-        JSON format:
-        {{"clauses": ["clause1", "clause2"]}}"""
+        if "Error" in result_text:
+            # Fallback extraction
+            sentences = re.split(r'[.!?]+', chunk)
+            return [s.strip() for s in sentences if len(s.strip()) > 30][:10], False
         
-        try:
-            messages = [
-                {"role": "system", "content": "Extract clauses. Return only JSON."},
-                {"role": "user", "content": prompt}
-            ]
-            
-            result_text = await groq_call_with_retry(client, messages, max_retries=2)
-            
-            if "Error" in result_text:
-                # Fallback extraction
-                sentences = re.split(r'[.!?]+', chunk)
-                clauses = [s.strip() for s in sentences if len(s.strip()) > 30][:10]
-                all_clauses.extend(clauses)
-                continue
-            
-            # Extract JSON
-            json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-            if json_match:
-                data = json.loads(json_match.group())
-                all_clauses.extend(data.get("clauses", [])[:10])  # Limit clauses
+        # Extract JSON
+        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        if json_match:
+            data = json.loads(json_match.group())
+            return data.get("clauses", [])[:10], True  # Limit clauses
+        return [], False
             
-            # Add delay between chunks
-            if i < len(chunks) - 1:
-                await asyncio.sleep(2)
-                
-        except Exception as e:
-            print(f"Error extracting from chunk {i}: {e}")
-            # Fallback
-            sentences = re.split(r'[.!?]+', chunk)
-            clauses = [s.strip() for s in sentences if len(s.strip()) > 30][:5]
-            all_clauses.extend(clauses)
-    
-    return {
-        "clauses": list(set(all_clauses))[:20],  # Limit total clauses
-        "entities": [],
-        "sections": []
-    }
\ No newline at end of file
+    except Exception as e:
+        logger.warning(f"Error extracting from chunk {i}: {e}")
+        # Fallback
+        sentences = re.split(r'[.!?]+', chunk)
+        return [s.strip() for s in sentences if len(s.strip()) > 30][:5], False
@@ -0,0 +1,212 @@
+# services/llm_gateway.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import httpx
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+from services.rate_limiter import groq_scheduler, estimate_tokens, PRIORITY_ANSWER
+from services.llm_cache import llm_cache
+from services.metrics import (CACHE_LOOKUPS, IN_FLIGHT, LLM_CALL_SECONDS, LLM_RETRIES, LLM_TOKENS,
+                              LLM_WAIT_SECONDS, cache_lookup, record_stage)
+
+if TYPE_CHECKING:
+    from groq import AsyncGroq
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+MAX_TOKENS = 600
+TEMPERATURE = 0.1
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+
+
+class LLMStats:
+    """Counters for calls through the gateway"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "queue_depth": groq_scheduler.queue_depth,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "avg_seconds": self.seconds / self.calls if self.calls else 0.0,
+                "max_seconds": self.max_seconds,
+            }
+
+
+class LLMGateway:
+    """Single shared entry point for Groq chat completions.
+
+    Uses one pooled AsyncGroq client for the whole process and coalesces
+    identical in-flight requests, so two requests extracting the same chunk
+    share one upstream call. Successful responses are kept in the persistent
+    response cache, since prompts are deterministic templates.
+    """
+
+    def __init__(self, cache=llm_cache):
+        self._client = None
+        self.cache = cache
+        self._inflight = {}
+        self.stats = LLMStats()
+
+    @property
+    def client(self) -> "AsyncGroq":
+        if self._client is None:
+            # The SDK is imported with the first call rather than at startup
+            from groq import AsyncGroq, DefaultAsyncHttpxClient
+            self._client = AsyncGroq(
+                api_key=os.environ.get("GROQ_API_KEY"),
+                max_retries=0,  # retries are handled here, under the scheduler
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                        max_keepalive_connections=LLM_MAX_CONNECTIONS)
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    @staticmethod
+    def request_key(messages, model, max_tokens, temperature) -> str:
+        payload = json.dumps([messages, model, max_tokens, temperature], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def complete(self, messages, model=DEFAULT_MODEL, max_retries=3, priority=PRIORITY_ANSWER,
+                       max_tokens=MAX_TOKENS, temperature=TEMPERATURE) -> str:
+        """Chat completion text, or an "Error ..." string once retries run out"""
+        key = self.request_key(messages, model, max_tokens, temperature)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            cache_lookup("llm", cached is not None)
+            if cached is not None:
+                self.stats.add(cache_hits=1)
+                return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._call_and_store(key, messages, model, max_retries, priority, max_tokens, temperature))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats.add(coalesced=1)
+            CACHE_LOOKUPS.inc("llm_inflight", "hit")
+        # Shielded so one cancelled waiter does not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _call_and_store(self, key, *args):
+        text, ok = await self._call_with_retry(*args)
+        # Error strings are returned to callers but never cached
+        if ok and text and self.cache is not None:
+            self.cache.put(key, text)
+        return text
+
+    async def _call_with_retry(self, messages, model, max_retries, priority, max_tokens, temperature):
+        reserved = estimate_tokens(messages) + max_tokens
+        for attempt in range(max_retries):
+            try:
+                # Wait for request and token budget
+                start = time.perf_counter()
+                await groq_scheduler.acquire(reserved, priority)
+                waited = time.perf_counter() - start
+                LLM_WAIT_SECONDS.observe(waited)
+                record_stage("llm_wait", waited)
+
+                self.stats.add(calls=1, in_flight=1)
+                IN_FLIGHT.inc("llm_calls")
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    response = await self.client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                    )
+                    outcome = "ok"
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self.stats.add(in_flight=-1)
+                    self.stats.record_latency(elapsed)
+                    IN_FLIGHT.dec("llm_calls")
+                    LLM_CALL_SECONDS.observe(elapsed, outcome)
+                    record_stage("llm_call", elapsed)
+
+                usage = getattr(response, "usage", None)
+                if usage is not None and usage.total_tokens:
+                    groq_scheduler.refund(reserved - usage.total_tokens)
+                    self.stats.add(prompt_tokens=usage.prompt_tokens or 0,
+                                   completion_tokens=usage.completion_tokens or 0)
+                    LLM_TOKENS.inc("prompt", amount=usage.prompt_tokens or 0)
+                    LLM_TOKENS.inc("completion", amount=usage.completion_tokens or 0)
+                return response.choices[0].message.content, True
+
+            except Exception as e:
+                error_str = str(e)
+                rate_limited = "rate_limit_exceeded" in error_str
+                if attempt < max_retries - 1:
+                    self.stats.add(retries=1)
+                    LLM_RETRIES.inc("rate_limit" if rate_limited else "error")
+                if rate_limited:
+                    # Extract wait time from error message
+                    wait_match = re.search(r'try again in (\d+\.?\d*)s', error_str)
+                    wait_time = float(wait_match.group(1)) if wait_match else 15
+
+                    logger.warning(f"Rate limit hit, waiting {wait_time + 2} seconds...")
+                    await asyncio.sleep(wait_time + 2)
+                    record_stage("llm_backoff", wait_time + 2)
+                    continue
+                else:
+                    logger.warning(f"Attempt {attempt + 1} failed: {e}")
+                    if attempt == max_retries - 1:
+                        self.stats.add(errors=1)
+                        return f"Error after {max_retries} attempts: {str(e)}", False
+                    await asyncio.sleep(2)
+                    record_stage("llm_backoff", 2)
+
+        self.stats.add(errors=1)
+        return "Failed after all retry attempts", False
+
+
+# Singleton for API usage
+llm_gateway = LLMGateway()
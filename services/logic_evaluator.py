@@ -1,20 +1,22 @@
-import os
-from groq import Groq
 from typing import List, Tuple, Dict
-import asyncio
-from services.rate_limiter import groq_call_with_retry
+from services.llm_gateway import llm_gateway
+from services.context_packer import (ANSWER_TOKENS, CLAUSE_TOKEN_LIMIT, Batch, build_messages,
+                                     completion_budget, parse_answers)
+from services.tokenizer import trim_to_tokens
 
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# How llm_gateway.complete reports a call that failed for good
+FAILURE_PREFIXES = ("Error after", "Failed after")
 
 async def evaluate_logic(question: str, matched_clauses: List[Dict], document_type: str = "policy") -> Tuple[str, str]:
     """Simplified logic evaluation to reduce token usage"""
     
-    # Take only top 3 clauses and shorten them
+    # Take only top 3 clauses, trimmed to the same token limit as packed batches
     top_clauses = []
     for mc in matched_clauses[:3]:
-        clause = mc["clause"]
-        if len(clause) > 200:
-            clause = clause[:200] + "..."
+        clause = trim_to_tokens(mc["clause"], CLAUSE_TOKEN_LIMIT)
+        if mc.get("source"):
+            # Multi-document queries: say which document each clause is from
+            clause = f"[{mc['source']}] {clause}"
         top_clauses.append(clause)
     
     context = "\n".join([f"- {clause}" for clause in top_clauses])
@@ -32,14 +34,25 @@ Provide a direct answer based on the context above. Keep response under 100 word
             {"role": "user", "content": prompt}
         ]
         
-        response = await groq_call_with_retry(client, messages, max_retries=2)
-        
-        if "Error" in response:
+        # Length is bounded by max_tokens rather than cutting the answer mid-sentence
+        response = await llm_gateway.complete(messages, max_retries=2, max_tokens=ANSWER_TOKENS)
+
+        if response.startswith(FAILURE_PREFIXES):
             return f"Unable to process: Rate limit reached", "Please try again in a few minutes"
-        
-        # Limit response length
-        answer = response[:200] if len(response) > 200 else response
-        return answer, "Analysis completed"
-        
+
+        return response.strip(), "Analysis completed"
+
     except Exception as e:
-        return f"Unable to evaluate: {str(e)}", "Error in processing"
\ No newline at end of file
+        return f"Unable to evaluate: {str(e)}", "Error in processing"
+
+async def evaluate_batch(batch: Batch) -> Dict[int, str]:
+    """Answer all questions of a packed batch with one LLM call.
+
+    Returns answers by original question position; questions the response
+    did not answer are missing from the dict.
+    """
+    response = await llm_gateway.complete(build_messages(batch), max_retries=2,
+                                          max_tokens=completion_budget(batch))
+    if response.startswith(FAILURE_PREFIXES):
+        return {i: "Unable to process: Rate limit reached" for i in batch.indices}
+    return parse_answers(response, batch)
\ No newline at end of file
@@ -0,0 +1,256 @@
+# services/metrics.py
+import bisect
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+# Latency buckets in seconds, from cache hits up to rate-limit backoffs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Per-request {stage: seconds}, set by the HTTP middleware in main.py
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# Per-request {"peak": MB}, the highest resident memory sampled while it ran
+request_memory: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_memory", default=None)
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) if hasattr(os, "sysconf") else 0.0
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Settable gauge; set_function() makes it read a live value at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._functions: Dict[tuple, Callable[[], float]] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, fn: Callable[[], float], *labels: str):
+        self._functions[labels] = fn
+
+    @contextmanager
+    def track(self, *labels: str):
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, fn in self._functions.items():
+            values[labels] = float(fn())
+        return self._header() + [f"{self.name}{_format_labels(self.labels, k)} {v}"
+                                 for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket counts (last one is +Inf), sum
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Singleton for API usage
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.histogram(
+    "docretrieve_request_seconds", "HTTP request latency", ("route", "status"))
+STAGE_SECONDS = metrics.histogram(
+    "docretrieve_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+LLM_CALL_SECONDS = metrics.histogram(
+    "docretrieve_llm_call_seconds", "Latency of upstream LLM calls", ("outcome",))
+LLM_WAIT_SECONDS = metrics.histogram(
+    "docretrieve_llm_wait_seconds", "Time LLM calls waited for the rate limiter and token budget")
+LLM_TOKENS = metrics.counter(
+    "docretrieve_llm_tokens_total", "Tokens reported by the LLM", ("kind",))
+LLM_RETRIES = metrics.counter(
+    "docretrieve_llm_retries_total", "LLM call retries", ("reason",))
+CACHE_LOOKUPS = metrics.counter(
+    "docretrieve_cache_lookups_total", "Cache lookups", ("cache", "result"))
+FALLBACKS = metrics.counter(
+    "docretrieve_fallbacks_total", "Times a fallback path was taken", ("kind",))
+IN_FLIGHT = metrics.gauge(
+    "docretrieve_in_flight", "Operations currently in progress", ("kind",))
+ANSWERS = metrics.counter(
+    "docretrieve_answers_total", "Answers by the path that produced them", ("path",))
+MEMORY = metrics.gauge(
+    "docretrieve_memory_megabytes", "Resident memory of the process", ("kind",))
+
+
+def peak_rss_mb() -> float:
+    """Highest resident memory of the process so far"""
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def sample_rss() -> float:
+    """Read resident memory and raise the current request's peak to it.
+
+    The process is shared by concurrent requests, so a request's peak is the
+    process's highest resident memory seen while it ran.
+    """
+    rss = current_rss_mb()
+    memory = request_memory.get()
+    if memory is not None and rss > memory.get("peak", 0.0):
+        memory["peak"] = rss
+    return rss
+
+
+def request_peak_mb() -> Optional[float]:
+    """Peak resident memory of the current request so far, None outside one"""
+    sample_rss()
+    memory = request_memory.get()
+    if not memory:
+        return None
+    return round(memory["peak"], 1)
+
+
+MEMORY.set_function(current_rss_mb, "resident")
+MEMORY.set_function(peak_rss_mb, "peak")
+
+
+def record_stage(stage: str, seconds: float):
+    """Add to the stage histogram and to the current request's breakdown.
+
+    Concurrent work in the same stage (e.g. several LLM calls) is summed, so
+    a breakdown can exceed the request's wall time.
+    """
+    STAGE_SECONDS.observe(seconds, stage)
+    sample_rss()
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache, "hit" if hit else "miss")
+
+
+def server_timing(timings: Dict[str, float], total: float, peak_mb: Optional[float] = None) -> str:
+    """Format a breakdown as a Server-Timing header value (milliseconds),
+    with the request's peak resident memory as a description-only entry"""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    if peak_mb is not None:
+        parts.append(f'peak-rss;desc="{peak_mb:.1f} MB"')
+    return ", ".join(parts)
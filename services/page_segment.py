@@ -0,0 +1,193 @@
+# services/page_segment.py
+import mmap
+import os
+import struct
+import tempfile
+import logging
+from array import array
+from collections.abc import Sequence
+from typing import List, Optional, Union
+
+import numpy as np
+
+from services.metrics import sample_rss
+
+logger = logging.getLogger(__name__)
+
+# Documents with more pages than this are processed in large-document mode:
+# page texts are spilled to a segment file instead of kept on the heap
+LARGE_DOC_PAGES = int(os.environ.get("LARGE_DOC_PAGES", 300))
+# Resident memory (MB) past which pages are spilled whatever the page count,
+# and PDF extraction stops reading ahead; 0 disables the check
+LARGE_DOC_RSS_MB = float(os.environ.get("LARGE_DOC_RSS_MB", 0))
+
+# Footer of a segment file: item count, total stripped characters, magic
+TRAILER = struct.Struct("<qq8s")
+MAGIC = b"DRSEG001"
+
+
+def over_memory_budget() -> bool:
+    return LARGE_DOC_RSS_MB > 0 and sample_rss() > LARGE_DOC_RSS_MB
+
+
+class SegmentWriter:
+    """Append-only file of texts: UTF-8 bytes back to back, then their offsets.
+
+    Missing texts (failed or empty pages) are stored as empty strings.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chars = 0
+        self._file = open(path, "wb")
+        self._offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, text: Optional[str]):
+        data = (text or "").encode("utf-8")
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self.chars += len(text.strip()) if text else 0
+
+    def close(self) -> "PageSegment":
+        self._file.write(self._offsets.tobytes())
+        self._file.write(TRAILER.pack(len(self), self.chars, MAGIC))
+        self._file.close()
+        return PageSegment(self.path)
+
+    def abort(self):
+        self._file.close()
+        _remove(self.path)
+
+
+class PageSegment(Sequence):
+    """Read-only, mmap'd view of a segment file; items are decoded on access.
+
+    Behaves as a list of str, so pages and passages stored this way go
+    wherever a list would, while only the items in use are in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mmap)
+        count, self.chars, magic = TRAILER.unpack_from(self._mmap, size - TRAILER.size)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a segment file")
+        table = size - TRAILER.size - 8 * (count + 1)
+        self._offsets = np.frombuffer(self._mmap, dtype="<i8", count=count + 1, offset=table)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def move(self, path: str):
+        """Rename the file; the mapping stays valid"""
+        os.replace(self.path, path)
+        self.path = path
+
+    def close(self):
+        self._offsets = np.zeros(1, dtype="<i8")
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a caller still holds a view, the mapping goes with it
+
+    def delete(self):
+        self.close()
+        _remove(self.path)
+
+
+def write_segment(path: str, texts) -> PageSegment:
+    writer = SegmentWriter(path)
+    try:
+        for text in texts:
+            writer.append(text)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def temp_segment_path(directory: Optional[str] = None) -> str:
+    """A new file name for a segment; names starting with .tmp are skipped by cache eviction"""
+    fd, path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".seg")
+    os.close(fd)
+    return path
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove segment {path}: {e}")
+
+
+class PageSpool:
+    """Collects page texts in memory, moving them to a segment file past the budget.
+
+    Up to LARGE_DOC_PAGES pages (and while resident memory is under
+    LARGE_DOC_RSS_MB) pages are kept as a list. Past that, everything so far
+    and every later page goes to a segment file in `directory`, so a
+    thousand-page PDF costs a few pages of heap. finish() returns the list or
+    the mapped PageSegment; discard() removes a spill file nobody adopted.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_pages: int = LARGE_DOC_PAGES):
+        self.directory = directory
+        self.max_pages = max_pages
+        self._pages: List[Optional[str]] = []
+        self._writer: Optional[SegmentWriter] = None
+        self._segment: Optional[PageSegment] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._writer is not None
+
+    def __len__(self) -> int:
+        return len(self._writer) if self._writer is not None else len(self._pages)
+
+    def append(self, text: Optional[str]):
+        if self._writer is None:
+            self._pages.append(text)
+            if len(self._pages) > self.max_pages or over_memory_budget():
+                self._spill()
+        else:
+            self._writer.append(text)
+            sample_rss()
+
+    def _spill(self):
+        logger.info(f"Large document: spilling pages to disk after page {len(self._pages)}")
+        self._writer = SegmentWriter(temp_segment_path(self.directory))
+        for text in self._pages:
+            self._writer.append(text)
+        self._pages = []
+
+    def finish(self) -> Union[List[Optional[str]], PageSegment]:
+        if self._writer is None:
+            return self._pages
+        if self._segment is None:
+            self._segment = self._writer.close()
+        return self._segment
+
+    def discard(self):
+        """Remove the spill file unless it was moved elsewhere (see PageSegment.move)"""
+        if self._writer is None:
+            return
+        if self._segment is None:
+            self._writer.abort()
+        elif os.path.basename(self._segment.path).startswith(".tmp-"):
+            self._segment.delete()
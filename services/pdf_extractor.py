@@ -0,0 +1,154 @@
+# services/pdf_extractor.py
+import io
+import os
+import asyncio
+import tempfile
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from services.page_segment import LARGE_DOC_PAGES, over_memory_budget
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", 8))
+# Below this page count the process round trip costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 16))
+
+# A file path, or the document bytes when they are held in memory
+PDFSource = Union[str, bytes]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def open_pdf(source: PDFSource, pages=None):
+    """Open a PDF; `pages` (1-based numbers) limits the page objects it builds"""
+    # Imported on first use: it is only needed once a PDF arrives, mostly in pool workers
+    import pdfplumber
+    # BytesIO shares the bytes object until written to, so this does not copy
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source, pages=pages)
+
+
+def spill_source(source: bytes) -> str:
+    """Write in-memory PDF bytes to a temp file once, for the pool workers to open.
+
+    Passing the bytes instead would pickle them through the pool pipe for
+    every page range and leave a copy in every worker.
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(source)
+    return path
+
+
+def remove_spill(path: Optional[str]):
+    if path is not None:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove spill file {path}: {e}")
+
+
+def count_pages(source: PDFSource) -> int:
+    with open_pdf(source) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_range(source: PDFSource, start: int, end: int) -> List[Optional[str]]:
+    """Extract pages [start, end) of a PDF; failed or empty pages come back as None.
+
+    Runs inside a worker process, so it opens its own handle on the file, or
+    its own reader over the bytes it was sent.
+    """
+    texts = []
+    # Only build page objects for this range, not for the whole document
+    with open_pdf(source, pages=range(start + 1, end + 1)) as pdf:
+        pages = pdf.pages
+        for n in range(len(pages)):
+            page = pages[n]
+            # pdfplumber keeps every page it has built until the file is closed
+            pages[n] = None
+            try:
+                texts.append(page.extract_text() or None)
+            except Exception as e:
+                logger.warning(f"Error extracting page {start+n+1}: {e}")
+                texts.append(None)
+            finally:
+                # Drop cached layout objects before moving on
+                page.close()
+    return texts
+
+
+def join_pages(pages: List[Optional[str]]) -> str:
+    """Assemble page texts in order with a single join"""
+    for i, page_text in enumerate(pages):
+        if not page_text:
+            logger.warning(f"No text found on page {i+1}")
+    return "".join(page_text + "\n" for page_text in pages if page_text)
+
+
+async def iter_pdf_pages(source: PDFSource, num_pages: Optional[int] = None) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """Yield (page number, text) in page order as soon as each range is parsed.
+
+    Ranges are submitted to the pool up front, except for documents over
+    LARGE_DOC_PAGES: those only read a couple of ranges per worker ahead of
+    the consumer, and one range at a time while resident memory is over
+    LARGE_DOC_RSS_MB, so parsed pages never pile up. Closing the generator
+    early cancels the ranges that have not started yet.
+    """
+    loop = asyncio.get_running_loop()
+    if num_pages is None:
+        num_pages = await asyncio.to_thread(count_pages, source)
+    logger.info(f"Streaming PDF with {num_pages} pages")
+    workers = max(1, PDF_WORKERS)
+    chunk = max(1, min(PDF_PAGES_PER_TASK, -(-num_pages // workers)))
+    ranges = [(start, min(start + chunk, num_pages)) for start in range(0, num_pages, chunk)]
+    parallel = workers > 1 and num_pages >= PDF_PARALLEL_MIN_PAGES
+    read_ahead = 2 * workers if num_pages > LARGE_DOC_PAGES else len(ranges)
+    futures = []
+    # Workers get a path, never the bytes (see spill_source)
+    spill = None
+    if parallel and isinstance(source, bytes):
+        spill = await asyncio.to_thread(spill_source, source)
+
+    def submit(upto: int):
+        while len(futures) < min(upto, len(ranges)):
+            start, end = ranges[len(futures)]
+            futures.append(loop.run_in_executor(get_executor(), extract_page_range, spill or source, start, end))
+
+    try:
+        for n, (start, end) in enumerate(ranges):
+            try:
+                if parallel:
+                    submit(n + 1 if over_memory_budget() else n + read_ahead)
+                    texts = await futures[n]
+                    futures[n] = None
+                else:
+                    texts = await asyncio.to_thread(extract_page_range, source, start, end)
+            except Exception as e:
+                logger.warning(f"Error extracting pages {start+1}-{end}: {e}")
+                texts = [None] * (end - start)
+            for offset, page_text in enumerate(texts):
+                yield start + offset + 1, page_text
+    finally:
+        for future in futures:
+            if future is not None:
+                future.cancel()
+        # Ranges still running keep their open handle on the removed file
+        remove_spill(spill)
+
@@ -0,0 +1,294 @@
+# services/pipeline.py
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, List, Optional
+
+from services.bm25_index import PassageSplitter, StreamingBM25
+from services.document_cache import document_cache
+from services.document_loader import DocumentPayload, download_file, extract_pages, close_payload
+from services.index_registry import passage_registry
+from services.logic_evaluator import evaluate_logic, evaluate_batch
+from services.context_packer import pack_questions
+from services.extractive_answerer import confident_answer, resolve_mode
+from services.metrics import ANSWERS, FALLBACKS, record_stage, request_peak_mb, timed
+from services.page_segment import PageSegment, PageSpool
+from services.pdf_extractor import iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+# A question is answered early once its best passage holds this share of its content words
+STREAM_MIN_COVERAGE = float(os.environ.get("STREAM_MIN_COVERAGE", 0.8))
+STREAM_TOP_K = 3
+# Answer several questions per LLM call (see services/context_packer.py)
+LLM_BATCH_ANSWERS = os.environ.get("LLM_BATCH_ANSWERS", "1") == "1"
+
+
+async def iter_pages(payload: DocumentPayload) -> AsyncIterator[tuple]:
+    """Yield (page number, text) pairs; non-PDF documents come as sections"""
+    if payload.file_type == 'pdf':
+        yielded = False
+        try:
+            start = time.perf_counter()
+            async for page_no, page_text in iter_pdf_pages(payload.source):
+                # Only the wait for each page counts, not the consumer's work in between
+                record_stage("parse", time.perf_counter() - start)
+                yielded = True
+                yield page_no, page_text
+                start = time.perf_counter()
+            return
+        except Exception as e:
+            if yielded:
+                raise
+            logger.warning(f"Streaming PDF extraction failed, using full extraction: {e}")
+            FALLBACKS.inc("pdf_stream")
+    pages = await extract_pages(payload)
+    try:
+        for page_no, page_text in enumerate(pages, start=1):
+            yield page_no, page_text
+    finally:
+        if isinstance(pages, PageSegment):
+            pages.delete()
+
+
+def to_matches(indices, scores, texts) -> List[dict]:
+    return [{"clause": texts[i], "similarity": float(s)} for i, s in zip(indices, scores)]
+
+
+async def answer_event(index: int, question: str, matches: List[dict]) -> dict:
+    """Evaluate one question and wrap the result as an "answer" event"""
+    try:
+        text, _ = await evaluate_logic(question, matches)
+    except Exception as e:
+        logger.error(f"Error evaluating question '{question}': {e}")
+        text = f"Unable to process: {str(e)}"
+    ANSWERS.inc("llm")
+    return make_answer_event(index, text, matches)
+
+
+def make_answer_event(index: int, text: str, matches: List[dict]) -> dict:
+    event = {"event": "answer", "index": index, "answer": text}
+    sources = list(dict.fromkeys(m["source"] for m in matches[:3] if m.get("source")))
+    if sources:
+        event["sources"] = sources
+    return event
+
+
+def fast_answer_event(index: int, question: str, matches: List[dict], mode: Optional[str] = None) -> Optional[dict]:
+    """In fast mode, answer from the matched clauses without the LLM if confident enough.
+
+    The answer is a sentence of one clause; the event carries its score and
+    its span within that clause. None means the question needs the LLM.
+    """
+    if resolve_mode(mode) != "fast":
+        return None
+    extract = confident_answer(question, matches)
+    if extract is None:
+        FALLBACKS.inc("extractive")
+        return None
+    ANSWERS.inc("extractive")
+    event = make_answer_event(index, extract.text, matches[extract.clause:extract.clause + 1])
+    event.update(path="extractive", score=round(extract.score, 3), span=[extract.start, extract.end])
+    return event
+
+
+async def _completed(events: List[dict]) -> List[dict]:
+    return events
+
+
+async def answer_batch_events(batch, questions: List[str], matched_clauses: List[List[dict]]) -> List[dict]:
+    """Answer a packed batch in one call; questions it misses get their own call"""
+    try:
+        answers = await evaluate_batch(batch)
+    except Exception as e:
+        logger.error(f"Error evaluating batch of {len(batch.indices)} questions: {e}")
+        answers = {}
+    missing = [i for i in batch.indices if i not in answers]
+    if missing:
+        logger.warning(f"Batch answer missed {len(missing)} of {len(batch.indices)} questions")
+        FALLBACKS.inc("batch_answer", amount=len(missing))
+    events = [make_answer_event(i, answers[i], matched_clauses[i]) for i in batch.indices if i in answers]
+    ANSWERS.inc("llm", amount=len(events))
+    events += await asyncio.gather(*(
+        answer_event(i, questions[i], matched_clauses[i])
+        for i in missing))
+    return events
+
+
+def answer_tasks(questions: List[str], matched_clauses: List[List[dict]],
+                 indices: List[int] = None, mode: Optional[str] = None) -> List[asyncio.Future]:
+    """Start answering the questions at `indices` (default all), batched when enabled.
+
+    In fast mode, questions answered from their clauses come back in one
+    task that is done at once; only the rest go to the LLM.
+    """
+    if indices is None:
+        indices = list(range(len(questions)))
+    fast = [event for event in (fast_answer_event(i, questions[i], matched_clauses[i], mode) for i in indices)
+            if event is not None]
+    tasks = [asyncio.ensure_future(_completed(fast))] if fast else []
+    answered = {event["index"] for event in fast}
+    indices = [i for i in indices if i not in answered]
+    if not LLM_BATCH_ANSWERS:
+        return tasks + [asyncio.ensure_future(answer_event(i, questions[i], matched_clauses[i]))
+                        for i in indices]
+    return tasks + [asyncio.ensure_future(answer_batch_events(batch, questions, matched_clauses))
+                    for batch in pack_questions(questions, matched_clauses, indices)]
+
+
+async def as_completed_events(tasks) -> AsyncIterator[dict]:
+    """Yield task results in completion order, cancelling leftovers if closed early.
+
+    A task may return one event or a list of them.
+    """
+    tasks = set(tasks)
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                for event in (result if isinstance(result, list) else [result]):
+                    yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def merge_events(generators) -> AsyncIterator[dict]:
+    """Run several event generators concurrently, yielding events as they arrive.
+
+    The first exception raised by any generator is re-raised here, and the
+    remaining generators are cancelled.
+    """
+    queue = asyncio.Queue()
+    finished = object()
+
+    async def pump(generator):
+        try:
+            async for event in generator:
+                queue.put_nowait(event)
+            queue.put_nowait(finished)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            await generator.aclose()
+
+    tasks = [asyncio.ensure_future(pump(g)) for g in generators]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def stream_query(url: str, questions: List[str], mode: Optional[str] = None) -> AsyncIterator[dict]:
+    """Answer questions while the document is still being parsed.
+
+    Pages flow into passage splitting and an incremental BM25 index. After
+    each page, every unanswered question whose best passage covers enough of
+    its content words is sent to the LLM straight away. Parsing stops early
+    once all questions are in flight; the rest are answered against the full
+    index. Yields progress events and one "answer" event per question.
+    """
+    start = time.perf_counter()
+    payload = None
+    spool = None
+    tasks = set()
+    try:
+        validators = document_cache.get_validators(url)
+        payload, file_type, meta = await download_file(url, validators)
+        if meta["status"] == 304 and validators:
+            content_hash = validators["content_hash"]
+        else:
+            content_hash = meta["content_hash"]
+            document_cache.put_validators(url, meta)
+        yield {"event": "downloaded", "elapsed": time.perf_counter() - start}
+
+        engine = passage_registry.get(content_hash)
+        if engine is None and payload is None:
+            # Not modified, but the passages were evicted
+            payload, file_type, meta = await download_file(url)
+        if engine is not None:
+            yield {"event": "indexed", "passages": len(engine.texts), "cached": True,
+                   "elapsed": time.perf_counter() - start}
+            with timed("search"):
+                indices, scores = engine.search_batch(questions, STREAM_TOP_K)
+            matched = [to_matches(indices[i], scores[i], engine.texts) for i in range(len(questions))]
+            tasks = set(answer_tasks(questions, matched, mode=mode))
+        else:
+            index = StreamingBM25()
+            splitter = PassageSplitter()
+            # Past LARGE_DOC_PAGES the pages go to a segment file, not the heap
+            spool = PageSpool(document_cache.entries_dir)
+            pending = set(range(len(questions)))
+            complete = True
+            page_iter = iter_pages(payload)
+            async for page_no, page_text in page_iter:
+                spool.append(page_text)
+                with timed("index"):
+                    for passage in splitter.feed(page_text or ""):
+                        index.add(passage)
+                yield {"event": "parsed", "pages": page_no, "elapsed": time.perf_counter() - start}
+
+                with timed("search"):
+                    ready = []
+                    for i in sorted(pending):
+                        indices, scores = index.search(questions[i], STREAM_TOP_K)
+                        if len(indices) and index.coverage(questions[i], indices[0]) >= STREAM_MIN_COVERAGE:
+                            ready.append((i, to_matches(indices, scores, index.texts)))
+                for i, matches in ready:
+                    pending.discard(i)
+                    event = fast_answer_event(i, questions[i], matches, mode)
+                    if event is not None:
+                        yield event
+                    else:
+                        tasks.add(asyncio.ensure_future(answer_event(i, questions[i], matches)))
+
+                for task in [t for t in tasks if t.done()]:
+                    tasks.discard(task)
+                    yield task.result()
+
+                if not pending:
+                    # Every question is already answered or in flight
+                    complete = False
+                    await page_iter.aclose()
+                    logger.info(f"Stopped parsing early after page {page_no}")
+                    break
+
+            with timed("index"):
+                for passage in splitter.flush():
+                    index.add(passage)
+            yield {"event": "indexed", "passages": len(index.texts), "cached": False,
+                   "elapsed": time.perf_counter() - start}
+            matched = [[] for _ in questions]
+            for i in pending:
+                indices, scores = index.search(questions[i], STREAM_TOP_K)
+                matched[i] = to_matches(indices, scores, index.texts)
+            # Questions that never got an early answer go out together
+            tasks.update(answer_tasks(questions, matched, sorted(pending), mode))
+
+            if complete and index.texts:
+                # Full parse: keep the text and passage index for later requests
+                if document_cache.get_entry(content_hash) is None:
+                    document_cache.new_entry(content_hash, spool.finish())
+                await asyncio.to_thread(passage_registry.add, content_hash, index.texts)
+
+        async for event in as_completed_events(tasks):
+            yield event
+        yield {"event": "done", "elapsed": time.perf_counter() - start, "peak_rss_mb": request_peak_mb()}
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        if spool is not None:
+            spool.discard()
+        close_payload(payload)
@@ -1,63 +1,229 @@
 # services/rate_limiter.py
 import asyncio
+import heapq
+import itertools
+import os
 import time
-from functools import wraps
+from array import array
+from collections import deque
+from contextvars import ContextVar
+
+from services.tokenizer import message_tokens
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 class RateLimiter:
-    def __init__(self, max_calls=10, time_window=60):
+    """Sliding-window limiter: at most `max_calls` calls per `time_window` seconds.
+
+    Call times live in a deque, so expiring old calls is amortised O(1). With
+    `shared_path` the window is kept in a locked file instead, letting every
+    uvicorn worker on the host draw from the same budget.
+    """
+
+    def __init__(self, max_calls=10, time_window=60, shared_path=None):
         self.max_calls = max_calls
         self.time_window = time_window
-        self.calls = []
-    
+        self.calls = deque()
+        self.shared_path = shared_path
+        if shared_path and fcntl is None:
+            raise RuntimeError("Shared rate limiting needs fcntl (POSIX only)")
+
+    def _prune(self, calls, now):
+        while calls and now - calls[0] >= self.time_window:
+            calls.popleft()
+
+    def _wait_time(self, calls, now):
+        self._prune(calls, now)
+        if len(calls) < self.max_calls:
+            return 0.0
+        # The slot frees when the call max_calls back from the newest expires
+        return max(0.0, calls[len(calls) - self.max_calls] + self.time_window - now)
+
+    def _locked(self, update):
+        """Run `update(calls, now)` on the shared window under an exclusive file lock"""
+        fd = os.open(self.shared_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 8 * (self.max_calls + 1) * 2)
+            calls = deque(array("d", raw[:len(raw) - len(raw) % 8]))
+            result = update(calls, time.time())
+            # Only the newest max_calls times decide the wait; keeping no more
+            # bounds the file to what the read above takes in
+            while len(calls) > self.max_calls:
+                calls.popleft()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, array("d", calls).tobytes())
+            return result
+        finally:
+            os.close(fd)  # releases the lock
+
     def can_make_call(self):
-        now = time.time()
-        # Remove old calls outside time window
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.time_window]
-        return len(self.calls) < self.max_calls
-    
+        return self.time_until_available() == 0.0
+
     def record_call(self):
-        self.calls.append(time.time())
+        def update(calls, now):
+            self._prune(calls, now)
+            calls.append(now)
+        if self.shared_path:
+            self._locked(update)
+        else:
+            update(self.calls, time.monotonic())
 
-# Global rate limiter for Groq
-groq_limiter = RateLimiter(max_calls=8, time_window=60)  # Conservative limit
+    def time_until_available(self):
+        """Seconds until a slot frees up (0 if one is free now)"""
+        if self.shared_path:
+            return self._locked(self._wait_time)
+        return self._wait_time(self.calls, time.monotonic())
 
-async def groq_call_with_retry(client, messages, model="llama-3.1-8b-instant", max_retries=3):
-    """Groq API call with automatic retry and rate limiting"""
-    
-    for attempt in range(max_retries):
-        try:
-            # Check rate limit
-            if not groq_limiter.can_make_call():
-                print(f"Rate limit reached, waiting 10 seconds...")
-                await asyncio.sleep(10)
+    def try_acquire(self):
+        """Take a slot if one is free; otherwise return the seconds to wait"""
+        def update(calls, now):
+            wait = self._wait_time(calls, now)
+            if wait == 0.0:
+                calls.append(now)
+            return wait
+        if self.shared_path:
+            return self._locked(update)
+        return update(self.calls, time.monotonic())
+
+    async def acquire(self):
+        """Sleep exactly until a slot frees up, then take it"""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
+
+# Global rate limiter for Groq; set GROQ_LIMITER_FILE to share it across workers
+groq_limiter = RateLimiter(max_calls=int(os.environ.get("GROQ_MAX_CALLS", 8)),  # Conservative limit
+                           time_window=float(os.environ.get("GROQ_TIME_WINDOW", 60)),
+                           shared_path=os.environ.get("GROQ_LIMITER_FILE"))
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.capacity = capacity or per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount):
+        """Seconds until `amount` tokens are available"""
+        self._refill()
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# Identifies the HTTP request an LLM call belongs to, for fair sharing
+current_owner = ContextVar("llm_owner", default=None)
+
+PRIORITY_ANSWER = 0
+PRIORITY_EXTRACTION = 1
+
+
+class LLMScheduler:
+    """Dispatches LLM calls under a request budget and a tokens-per-minute bucket.
+
+    Waiters are ordered by priority, then by start-time fair queueing across
+    owners, so one request with many questions cannot starve the others.
+    """
+
+    def __init__(self, limiter, tokens_per_minute):
+        self.limiter = limiter
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._queue = []
+        self._seq = itertools.count()
+        self._finish = {}
+        self._virtual_time = 0
+        self._wakeup = None
+        self._task = None
+        self._loop = None
+
+    @property
+    def queue_depth(self):
+        return sum(1 for entry in self._queue if not entry[-1].done())
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._dispatch())
+
+    async def acquire(self, tokens, priority=PRIORITY_ANSWER, owner=None):
+        """Wait until the call may be sent; tokens are reserved on return"""
+        self._ensure_dispatcher()
+        if owner is None:
+            owner = current_owner.get()
+        start = max(self._virtual_time, self._finish.get(owner, 0))
+        self._finish[owner] = start + 1
+        future = self._loop.create_future()
+        heapq.heappush(self._queue, (priority, start, next(self._seq), tokens, future))
+        self._wakeup.set()
+        await future
+
+    def refund(self, tokens):
+        """Return reserved tokens that the call did not actually use"""
+        if tokens > 0:
+            self.token_bucket.refund(tokens)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            # Drop waiters that were cancelled while queued
+            while self._queue and self._queue[0][-1].done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
                 continue
-            
-            # Make the call
-            response = client.chat.completions.create(
-                messages=messages,
-                model=model,
-                max_tokens=600,  # Reduced from 200-400
-                temperature=0.1,
-            )
-            
-            groq_limiter.record_call()
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            error_str = str(e)
-            if "rate_limit_exceeded" in error_str:
-                # Extract wait time from error message
-                import re
-                wait_match = re.search(r'try again in (\d+\.?\d*)s', error_str)
-                wait_time = float(wait_match.group(1)) if wait_match else 15
-                
-                print(f"Rate limit hit, waiting {wait_time + 2} seconds...")
-                await asyncio.sleep(wait_time + 2)
+
+            priority, start, _, tokens, future = self._queue[0]
+            delay = self.token_bucket.delay_for(tokens)
+            if delay == 0:
+                # Takes the request slot only when tokens are available too
+                delay = self.limiter.try_acquire()
+            if delay > 0:
+                # Sleep until budget frees up or a more urgent waiter arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
                 continue
-            else:
-                print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
-                    return f"Error after {max_retries} attempts: {str(e)}"
-                await asyncio.sleep(2)
-    
-    return "Failed after all retry attempts"
\ No newline at end of file
+
+            heapq.heappop(self._queue)
+            self.token_bucket.consume(tokens)
+            self._virtual_time = start
+            self._finish = {o: f for o, f in self._finish.items() if f > start}
+            future.set_result(None)
+
+
+# Global scheduler for Groq, sharing the request budget of groq_limiter
+groq_scheduler = LLMScheduler(groq_limiter, tokens_per_minute=int(os.environ.get("GROQ_TOKENS_PER_MINUTE", 6000)))
+
+def estimate_tokens(messages):
+    """Prompt size in tokens, counted with the local tokenizer"""
+    return message_tokens(messages)
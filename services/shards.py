@@ -0,0 +1,67 @@
+# services/shards.py
+import logging
+import os
+from typing import List, Optional
+from urllib.parse import unquote, urlparse
+import numpy as np
+
+from services.embedding_search import Retriever, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on documents in one query
+MAX_DOCUMENTS = int(os.environ.get("MAX_DOCUMENTS", 10))
+
+
+def source_name(url: str) -> str:
+    """Short label for a document URL, its file name when it has one"""
+    name = os.path.basename(unquote(urlparse(url).path))
+    return name or url
+
+
+class Shard:
+    """One document's retrieval index within a multi-document query.
+
+    The engine is the per-document index from the registry, so the same shard
+    serves every request that includes the document.
+    """
+
+    def __init__(self, source: str, engine: Retriever, content_hash: Optional[str] = None):
+        self.source = source
+        self.engine = engine
+        self.content_hash = content_hash
+
+    @property
+    def texts(self) -> List[str]:
+        return self.engine.texts
+
+
+def scatter_gather(shards: List[Shard], questions: List[str], top_k: int = 3):
+    """Search every shard and merge into one global top-k per question.
+
+    Each shard contributes its own top-k, which always contains its share of
+    the global top-k. Returns (matches, scores, sources), aligned per question
+    with the best match first. Shards that fail to search are skipped.
+    """
+    results = []
+    for shard in shards:
+        try:
+            indices, scores = shard.engine.search_batch(questions, top_k)
+        except Exception as e:
+            logger.warning(f"Search failed for {shard.source}: {e}")
+            continue
+        results.append((shard, np.asarray(indices), np.asarray(scores, dtype=np.float32)))
+    if not results:
+        raise ValueError("No document index could be searched")
+
+    # Candidates side by side: column c holds one shard's j-th best per question
+    all_indices = np.hstack([indices for _, indices, _ in results])
+    all_scores = np.hstack([scores for _, _, scores in results])
+    column_shards = [shard for shard, indices, _ in results for _ in range(indices.shape[1])]
+    top, top_scores = top_k_rows(all_scores, top_k)
+
+    matches, sources = [], []
+    for q, row in enumerate(top):
+        matches.append([column_shards[c].texts[all_indices[q, c]] for c in row])
+        sources.append([column_shards[c].source for c in row])
+    return matches, top_scores.tolist(), sources
@@ -0,0 +1,70 @@
+# services/tokenizer.py
+import os
+import re
+import threading
+
+# tiktoken encoding used when the package is installed; Llama tokenizers are close to it
+TOKENIZER_ENCODING = os.environ.get("TOKENIZER_ENCODING", "cl100k_base")
+
+# Words, digit runs and single punctuation marks, roughly where BPE splits first
+PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_missing = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_missing
+    if _encoding is None and not _encoding_missing:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_missing:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception:
+                    _encoding_missing = True
+    return _encoding
+
+
+def _estimate(text: str) -> int:
+    tokens = 0
+    for piece in PIECE_RE.findall(text):
+        if piece[0].isdigit():
+            # Numbers are split into groups of up to three digits
+            tokens += (len(piece) + 2) // 3
+        elif len(piece) <= 6:
+            tokens += 1
+        else:
+            # Long words split into roughly four-character subwords
+            tokens += 1 + (len(piece) - 3) // 4
+    return tokens
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text`, exact with tiktoken, otherwise a close local estimate"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate(text)
+
+
+def trim_to_tokens(text: str, limit: int) -> str:
+    """Cut `text` at a word boundary so it fits in `limit` tokens"""
+    if count_tokens(text) <= limit:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    # Largest prefix of words that fits, with room for the ellipsis
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid])) + 1 <= limit:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]) + "..."
+
+
+def message_tokens(messages, overhead: int = 4) -> int:
+    """Prompt tokens for a chat request, with a small per-message overhead"""
+    return sum(count_tokens(m["content"]) + overhead for m in messages)
@@ -0,0 +1,71 @@
+# services/warmup.py
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from services.embedding_search import RETRIEVER
+
+logger = logging.getLogger(__name__)
+
+# Most recently used indexes and documents loaded ahead of the first request
+WARM_INDEXES = int(os.environ.get("WARM_INDEXES", 16))
+WARM_DOCUMENTS = int(os.environ.get("WARM_DOCUMENTS", 8))
+
+# Imported lazily on the request path, so importing them here moves the cost to startup
+HEAVY_MODULES = (
+    "sklearn.feature_extraction.text",
+    "scipy.sparse",
+    "pdfplumber",
+    "magic",
+    "groq",
+)
+
+_ready = threading.Event()
+_summary: dict = {}
+
+
+def warm_up() -> dict:
+    """Import heavy dependencies and load recently used indexes and documents.
+
+    Blocking; the server runs it in a thread, the prefork launcher runs it
+    in the parent before forking so workers share the result.
+    """
+    start = time.perf_counter()
+    imported = []
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+            imported.append(name)
+        except ImportError as e:
+            logger.warning(f"Could not preload {name}: {e}")
+    if RETRIEVER == "dense":
+        # Load the embedding model before the first request needs it
+        from services.dense_search import get_encoder
+        get_encoder()
+
+    from services.index_registry import index_registry, passage_registry
+    from services.document_cache import document_cache
+    summary = {
+        "modules": len(imported),
+        "indexes": index_registry.warm(WARM_INDEXES) + passage_registry.warm(WARM_INDEXES),
+        "documents": document_cache.warm(WARM_DOCUMENTS),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"Warm-up done: {summary}")
+    return summary
+
+
+def mark_ready(summary: Optional[dict] = None):
+    _summary.update(summary or {})
+    _ready.set()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def readiness() -> dict:
+    return {"status": "ready" if is_ready() else "warming", **_summary}
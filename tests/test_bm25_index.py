@@ -0,0 +1,85 @@
+# tests/test_bm25_index.py
+import json
+import os
+
+import numpy as np
+import pytest
+
+from services.bm25_index import BM25Engine, StreamingBM25, iter_passages, split_passages
+from services.pdf_extractor import join_pages
+
+TEXTS = [
+    "The waiting period for pre-existing diseases is 36 months of continuous coverage.",
+    "Room rent is capped at one percent of the sum insured per day.",
+    "Maternity expenses are covered after a waiting period of 24 months.",
+    "Cataract surgery is limited to 40,000 per eye in any policy year.",
+    "Ambulance charges up to 2,000 per hospitalisation are covered.",
+]
+QUERIES = ["waiting period for maternity", "room rent limit", "cataract surgery per eye", "helicopter"]
+
+
+def _built():
+    engine = BM25Engine()
+    engine.build_index(TEXTS)
+    return engine
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_index_answers_like_the_original(tmp_path, mmap):
+    engine = _built()
+    engine.save(str(tmp_path / "index"))
+    loaded = BM25Engine.load(str(tmp_path / "index"), mmap=mmap)
+
+    assert list(loaded.texts) == TEXTS
+    assert loaded.vocabulary == engine.vocabulary
+    indices, scores = engine.search_batch(QUERIES)
+    loaded_indices, loaded_scores = loaded.search_batch(QUERIES)
+    np.testing.assert_array_equal(loaded_indices, indices)
+    np.testing.assert_allclose(loaded_scores, scores)
+    assert indices[0][0] == 2
+    assert indices[1][0] == 1
+
+
+def test_index_saved_with_texts_in_meta_still_loads(tmp_path):
+    path = str(tmp_path / "index")
+    _built().save(path)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    meta["texts"] = TEXTS
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    os.remove(os.path.join(path, "texts.seg"))
+
+    loaded = BM25Engine.load(path)
+    assert loaded.texts == TEXTS
+    assert loaded.search_batch(["room rent"])[0][0][0] == 1
+
+
+def test_unbuilt_index_refuses_queries():
+    with pytest.raises(ValueError):
+        BM25Engine().search_batch(["room rent"])
+
+
+def test_streaming_index_scores_like_the_batch_index():
+    engine = _built()
+    streaming = StreamingBM25()
+    for text in TEXTS:
+        streaming.add(text)
+    for query in QUERIES:
+        np.testing.assert_allclose(streaming.score(query), engine.score(query), rtol=1e-5)
+    indices, _ = streaming.search("room rent limit")
+    assert indices[0] == 1
+
+
+def test_empty_streaming_index_returns_nothing():
+    indices, scores = StreamingBM25().search("room rent")
+    assert len(indices) == 0 and len(scores) == 0
+
+
+def test_passages_stream_page_by_page_like_the_joined_text():
+    pages = [" ".join(f"page {p} word {w} of the schedule." for w in range(60)) for p in range(5)]
+    pages.insert(2, None)  # a page without text
+    expected = split_passages(join_pages(pages))
+    assert list(iter_passages(pages)) == expected
+    assert len(expected) > 5
+    assert all(len(passage) <= 600 for passage in expected)
@@ -0,0 +1,95 @@
+# tests/test_context_packer.py
+import asyncio
+
+import pytest
+
+from services import logic_evaluator
+from services.context_packer import Batch, build_messages, pack_questions, parse_answers
+from services.tokenizer import count_tokens
+
+
+def _batch(indices) -> Batch:
+    batch = Batch()
+    for i in indices:
+        batch.add(i, f"question {i}?", [], 0)
+    return batch
+
+
+def _matches(*clauses):
+    return [{"clause": clause} for clause in clauses]
+
+
+def test_shared_clauses_are_sent_once_per_batch():
+    questions = ["What is the waiting period?", "Is maternity covered?"]
+    matched = [_matches("Waiting period is 36 months."),
+               _matches("Waiting period is 36 months.", "Maternity is covered after 24 months.")]
+    [batch] = pack_questions(questions, matched)
+    assert batch.indices == [0, 1]
+    assert batch.clauses == ["Waiting period is 36 months.", "Maternity is covered after 24 months."]
+    assert batch.refs == [[1], [1, 2]]
+    prompt = build_messages(batch)[1]["content"]
+    assert prompt.count("Waiting period is 36 months.") == 1
+    assert "Q2: Is maternity covered? (context 1, 2)" in prompt
+
+
+def test_batches_respect_question_and_token_limits():
+    questions = [f"Question number {i} about clause {i}?" for i in range(7)]
+    matched = [_matches(f"Clause {i} " + "words " * 40) for i in range(7)]
+    batches = pack_questions(questions, matched, max_questions=3)
+    assert [len(b.indices) for b in batches] == [3, 3, 1]
+    assert sorted(i for b in batches for i in b.indices) == list(range(7))
+
+    budget = 300
+    for batch in pack_questions(questions, matched, budget=budget):
+        assert len(batch.indices) == 1 or batch.tokens <= budget
+        # The packer's estimate never undercounts what is sent
+        assert count_tokens(build_messages(batch)[1]["content"]) <= batch.tokens
+
+
+def test_only_the_given_questions_are_packed():
+    questions = ["a?", "b?", "c?"]
+    matched = [_matches("x"), _matches("y"), _matches("z")]
+    batches = pack_questions(questions, matched, indices=[2, 0])
+    assert sorted(i for b in batches for i in b.indices) == [0, 2]
+
+
+@pytest.mark.parametrize("response", [
+    '{"answers": {"Q1": "Thirty six months", "Q2": "Yes, after 24 months"}}',
+    '{"Q1": "Thirty six months", "Q2": "Yes, after 24 months"}',
+    '{"answers": ["Thirty six months", "Yes, after 24 months"]}',
+    '{"answers": {"Q1": {"answer": "Thirty six months"}, "2": {"answer": "Yes, after 24 months"}}}',
+    'Here you go:\n```json\n{"answers": {"Q1": " Thirty six months ", "Q2": "Yes, after 24 months"}}\n```',
+    'Q1: Thirty six months\nQ2) Yes, after 24 months',
+])
+def test_answers_map_back_to_question_positions(response):
+    assert parse_answers(response, _batch([4, 7])) == {4: "Thirty six months", 7: "Yes, after 24 months"}
+
+
+def test_unusable_answers_are_left_out():
+    batch = _batch([0, 1])
+    assert parse_answers('{"answers": {"Q1": "", "Q2": 42, "Q3": "extra"}}', batch) == {}
+    assert parse_answers('{"answers": {"Q2": "only the second"}}', batch) == {1: "only the second"}
+    assert parse_answers("I cannot answer that.", batch) == {}
+    assert parse_answers('{"answers": {"Q1": "cut off', batch) == {}
+
+
+def _evaluate_with(monkeypatch, response):
+    async def complete(messages, **kwargs):
+        return response
+
+    monkeypatch.setattr(logic_evaluator.llm_gateway, "complete", complete)
+    batch = pack_questions(["What is the error margin?"], [_matches("Error margin is 2%.")])[0]
+    single = asyncio.run(logic_evaluator.evaluate_logic("What is the error margin?", _matches("Error margin is 2%.")))
+    return single, asyncio.run(logic_evaluator.evaluate_batch(batch))
+
+
+def test_answers_mentioning_errors_are_not_failures(monkeypatch):
+    single, batched = _evaluate_with(monkeypatch, '{"answers": {"Q1": "Error margin is 2%."}}')
+    assert single == ('{"answers": {"Q1": "Error margin is 2%."}}', "Analysis completed")
+    assert batched == {0: "Error margin is 2%."}
+
+
+def test_gateway_failures_are_reported(monkeypatch):
+    single, batched = _evaluate_with(monkeypatch, "Error after 2 attempts: timeout")
+    assert single[0] == "Unable to process: Rate limit reached"
+    assert batched == {0: "Unable to process: Rate limit reached"}
@@ -0,0 +1,104 @@
+# tests/test_docx_reader.py
+import io
+import zipfile
+
+import pytest
+
+from services.docx_reader import DocxBlock, iter_docx_blocks, read_docx_text
+
+NS = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+      'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"')
+
+
+def _p(*runs: str) -> str:
+    return "<w:p>" + "".join(f"<w:r>{run}</w:r>" for run in runs) + "</w:p>"
+
+
+def _t(text: str) -> str:
+    return f'<w:t xml:space="preserve">{text}</w:t>'
+
+
+def _table(rows) -> str:
+    cells = "".join("<w:tr>" + "".join(f"<w:tc>{cell}</w:tc>" for cell in row) + "</w:tr>" for row in rows)
+    return f"<w:tbl>{cells}</w:tbl>"
+
+
+def _docx(body: str, parts=None) -> io.BytesIO:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {NS}><w:body>{body}</w:body></w:document>")
+        for name, xml in (parts or {}).items():
+            root = "hdr" if name.startswith("header") else "ftr"
+            archive.writestr(f"word/{name}.xml", f"<w:{root} {NS}>{xml}</w:{root}>")
+    data.seek(0)
+    return data
+
+
+def test_paragraph_runs_tabs_and_breaks():
+    body = _p(_t("Sum "), _t("insured"), "<w:tab/>", _t("5 lakhs"), "<w:br/>", _t("per year"))
+    body += _p(_t("   "))  # blank paragraphs are dropped
+    assert list(iter_docx_blocks(_docx(body))) == [DocxBlock("body", "paragraph", "Sum insured\t5 lakhs\nper year")]
+
+
+def test_deleted_and_field_code_text_is_skipped():
+    body = ("<w:p><w:r>" + _t("Waiting period: ") + "</w:r>"
+            "<w:del><w:r><w:delText>24</w:delText>" + _t("24") + "</w:r></w:del>"
+            "<w:ins><w:r>" + _t("36") + "</w:r></w:ins>"
+            "<w:moveFrom><w:r>" + _t(" old") + "</w:r></w:moveFrom>"
+            "<w:r><w:instrText> PAGE </w:instrText>" + _t(" months") + "</w:r></w:p>")
+    assert read_docx_text(_docx(body)) == "Waiting period: 36 months"
+
+
+def test_text_box_fallback_is_not_read_twice():
+    body = ("<w:p><w:r><mc:AlternateContent><mc:Choice>" + _p(_t("Boxed note")) + "</mc:Choice>"
+            "<mc:Fallback>" + _p(_t("Boxed note")) + "</mc:Fallback></mc:AlternateContent></w:r></w:p>")
+    assert read_docx_text(_docx(body)) == "Boxed note"
+
+
+def test_tables_come_out_one_row_per_line():
+    table = _table([[_p(_t("Benefit")), _p(_t("Limit"))],
+                    [_p(_t("Room rent")), _p(_t("1% of")) + _p(_t("sum insured"))],
+                    [_p(_t("ICU")), ""]])
+    body = _p(_t("Schedule")) + table + _p(_t("After the table"))
+    blocks = list(iter_docx_blocks(_docx(body)))
+    assert DocxBlock("body", "cell", "1% of\nsum insured", 0, 1, 1) in blocks
+    assert read_docx_text(_docx(body)).split("\n") == [
+        "Schedule", "Benefit | Limit", "Room rent | 1% of sum insured", "ICU", "After the table"]
+
+
+def test_nested_tables_report_the_inner_table():
+    inner = _table([[_p(_t("inner a")), _p(_t("inner b"))]])
+    outer = _table([[_p(_t("outer")), inner]])
+    blocks = [b for b in iter_docx_blocks(_docx(outer)) if b.kind == "cell"]
+    assert [(b.text, b.table, b.row, b.column) for b in blocks] == [
+        ("outer", 0, 0, 0), ("inner a", 1, 0, 0), ("inner b", 1, 0, 1)]
+
+
+def test_headers_first_footers_last_each_text_once():
+    parts = {
+        "header2": _p(_t("Policy wording")),
+        "header1": _p(_t("Policy wording")) + _p(_t("Acme Insurance")),
+        "footer1": _p(_t("Page footer")),
+        "footer3": _p(_t("Page footer")),
+    }
+    blocks = list(iter_docx_blocks(_docx(_p(_t("Body text")), parts)))
+    assert [(b.part, b.text) for b in blocks] == [
+        ("header1", "Policy wording"), ("header1", "Acme Insurance"),
+        ("body", "Body text"), ("footer1", "Page footer")]
+
+
+def test_reads_from_a_path(tmp_path):
+    path = tmp_path / "policy.docx"
+    path.write_bytes(_docx(_p(_t("From disk"))).getvalue())
+    assert read_docx_text(str(path)) == "From disk"
+
+
+def test_non_docx_files_raise():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("content.xml", "<x/>")
+    archive.seek(0)
+    with pytest.raises(KeyError):
+        list(iter_docx_blocks(archive))
+    with pytest.raises(zipfile.BadZipFile):
+        list(iter_docx_blocks(io.BytesIO(b"%PDF-1.7 not a zip")))
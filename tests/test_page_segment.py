@@ -0,0 +1,100 @@
+# tests/test_page_segment.py
+import os
+
+import pytest
+
+from services.page_segment import PageSegment, PageSpool, write_segment
+
+TEXTS = ["First page.", None, "", "Prämie: 1.200 € — 36 months", "  last page  "]
+
+
+def test_segment_round_trip(tmp_path):
+    segment = write_segment(str(tmp_path / "pages.seg"), TEXTS)
+    assert len(segment) == 5
+    assert list(segment) == ["First page.", "", "", "Prämie: 1.200 € — 36 months", "  last page  "]
+    assert segment[-1] == "  last page  "
+    assert segment[1:4:2] == ["", "Prämie: 1.200 € — 36 months"]
+    assert segment.chars == sum(len(t.strip()) for t in TEXTS if t)
+    with pytest.raises(IndexError):
+        segment[5]
+    reopened = PageSegment(segment.path)
+    assert list(reopened) == list(segment)
+    reopened.close()
+    segment.close()
+
+
+def test_empty_segment(tmp_path):
+    segment = write_segment(str(tmp_path / "empty.seg"), [])
+    assert len(segment) == 0 and list(segment) == [] and segment.chars == 0
+    segment.close()
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "other.seg"
+    path.write_bytes(b"not a segment file at all, just text")
+    with pytest.raises(ValueError):
+        PageSegment(str(path))
+
+
+def test_failed_write_leaves_no_file(tmp_path):
+    path = str(tmp_path / "broken.seg")
+
+    def texts():
+        yield "one"
+        raise RuntimeError("parser died")
+
+    with pytest.raises(RuntimeError):
+        write_segment(path, texts())
+    assert not os.path.exists(path)
+
+
+def test_moved_segment_stays_readable_and_delete_removes_it(tmp_path):
+    segment = write_segment(str(tmp_path / "a.seg"), ["one", "two"])
+    segment.move(str(tmp_path / "b.seg"))
+    assert not os.path.exists(tmp_path / "a.seg")
+    assert segment[1] == "two"
+    segment.delete()
+    assert not os.path.exists(tmp_path / "b.seg")
+
+
+def test_spool_keeps_small_documents_in_memory(tmp_path):
+    spool = PageSpool(str(tmp_path), max_pages=3)
+    for text in ["a", None, "c"]:
+        spool.append(text)
+    assert not spool.spilled
+    assert spool.finish() == ["a", None, "c"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_spool_spills_large_documents_in_order(tmp_path):
+    spool = PageSpool(str(tmp_path), max_pages=3)
+    texts = [f"page {n}" for n in range(10)]
+    for text in texts:
+        spool.append(text)
+    assert spool.spilled and len(spool) == 10
+    pages = spool.finish()
+    assert isinstance(pages, PageSegment)
+    assert list(pages) == texts
+    assert os.path.basename(pages.path).startswith(".tmp-")
+    spool.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def test_discard_keeps_an_adopted_segment(tmp_path):
+    spool = PageSpool(str(tmp_path), max_pages=1)
+    for text in ["one", "two"]:
+        spool.append(text)
+    pages = spool.finish()
+    pages.move(str(tmp_path / "kept.seg"))
+    spool.discard()
+    assert os.listdir(tmp_path) == ["kept.seg"]
+    assert list(pages) == ["one", "two"]
+    pages.close()
+
+
+def test_discard_before_finish_removes_the_partial_file(tmp_path):
+    spool = PageSpool(str(tmp_path), max_pages=1)
+    for text in ["one", "two", "three"]:
+        spool.append(text)
+    spool.discard()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,119 @@
+# tests/test_rate_limiter.py
+import asyncio
+import os
+import time
+
+import pytest
+
+from services.rate_limiter import LLMScheduler, PRIORITY_ANSWER, PRIORITY_EXTRACTION, RateLimiter, TokenBucket
+
+
+def test_limiter_admits_max_calls_then_waits_out_the_window():
+    limiter = RateLimiter(max_calls=2, time_window=0.3)
+    assert limiter.try_acquire() == 0.0
+    assert limiter.try_acquire() == 0.0
+    wait = limiter.try_acquire()
+    assert 0.2 < wait <= 0.3
+    time.sleep(wait + 0.01)
+    assert limiter.try_acquire() == 0.0
+
+
+def test_record_call_expires_old_calls():
+    limiter = RateLimiter(max_calls=2, time_window=0.1)
+    limiter.record_call()
+    limiter.record_call()
+    assert not limiter.can_make_call()
+    time.sleep(0.15)
+    assert limiter.can_make_call()
+    limiter.record_call()
+    assert len(limiter.calls) == 1
+
+
+def test_shared_limiters_draw_from_one_budget(tmp_path):
+    path = str(tmp_path / "groq.lim")
+    first = RateLimiter(max_calls=3, time_window=60, shared_path=path)
+    second = RateLimiter(max_calls=3, time_window=60, shared_path=path)
+    assert first.try_acquire() == 0.0
+    assert second.try_acquire() == 0.0
+    assert first.try_acquire() == 0.0
+    assert second.try_acquire() > 59
+    assert first.time_until_available() > 59
+
+
+def test_shared_file_stays_bounded(tmp_path):
+    path = str(tmp_path / "groq.lim")
+    limiter = RateLimiter(max_calls=3, time_window=60, shared_path=path)
+    for _ in range(50):
+        limiter.record_call()
+    assert os.path.getsize(path) == 8 * 3
+    assert not limiter.can_make_call()
+
+
+def test_token_bucket_delay_consume_and_refund():
+    bucket = TokenBucket(per_minute=60)  # one token a second
+    assert bucket.delay_for(60) == 0.0
+    bucket.consume(50)
+    assert bucket.delay_for(20) == pytest.approx(10, abs=0.1)
+    # Oversized requests only wait for a full bucket
+    assert bucket.delay_for(1000) == pytest.approx(50, abs=0.1)
+    bucket.refund(50)
+    assert bucket.delay_for(60) == 0.0
+
+
+def _dispatch_order(scheduler, calls):
+    """Owners in the order the scheduler lets `calls` (owner, priority) through"""
+    order = []
+
+    async def call(owner, priority):
+        await scheduler.acquire(1, priority, owner=owner)
+        order.append(owner)
+
+    async def main():
+        await asyncio.gather(*(call(owner, priority) for owner, priority in calls))
+
+    asyncio.run(main())
+    return order
+
+
+def test_scheduler_shares_fairly_between_owners():
+    scheduler = LLMScheduler(RateLimiter(max_calls=100, time_window=60), tokens_per_minute=6000)
+    calls = [("a", PRIORITY_ANSWER)] * 3 + [("b", PRIORITY_ANSWER)]
+    assert _dispatch_order(scheduler, calls) == ["a", "b", "a", "a"]
+
+
+def test_scheduler_serves_answers_before_extraction():
+    scheduler = LLMScheduler(RateLimiter(max_calls=100, time_window=60), tokens_per_minute=6000)
+    calls = [("extract", PRIORITY_EXTRACTION)] * 2 + [("answer", PRIORITY_ANSWER)]
+    assert _dispatch_order(scheduler, calls) == ["answer", "extract", "extract"]
+
+
+def test_scheduler_waits_for_tokens_and_refunds_release_them():
+    async def main():
+        scheduler = LLMScheduler(RateLimiter(max_calls=100, time_window=60), tokens_per_minute=600)
+        await scheduler.acquire(600)
+        start = time.monotonic()
+        await scheduler.acquire(5)  # ten tokens a second refill
+        waited = time.monotonic() - start
+        scheduler.refund(300)
+        start = time.monotonic()
+        await scheduler.acquire(300)
+        return waited, time.monotonic() - start
+
+    waited, refunded = asyncio.run(main())
+    assert 0.4 < waited < 1.5
+    assert refunded < 0.1
+
+
+def test_scheduler_holds_calls_to_the_request_budget():
+    async def main():
+        scheduler = LLMScheduler(RateLimiter(max_calls=2, time_window=0.3), tokens_per_minute=6000)
+        start = time.monotonic()
+        done = []
+        for _ in range(3):
+            await scheduler.acquire(1)
+            done.append(time.monotonic() - start)
+        return done
+
+    first, second, third = asyncio.run(main())
+    assert first < 0.1 and second < 0.1
+    assert 0.25 < third < 1.0
@@ -0,0 +1,109 @@
+# utils/prefork.py
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is restarted with a delay
+RESPAWN_DELAY = 1.0
+
+_in_worker = False
+
+
+def is_worker() -> bool:
+    """True inside a forked worker, where per-process startup work belongs to the parent"""
+    return _in_worker
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, log_level: str):
+    # The parent's handlers would forward signals to siblings; uvicorn installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(app, host: str = "0.0.0.0", port: int = 8000, workers: int = 2,
+          warm: Optional[Callable[[], None]] = None, log_level: str = "info"):
+    """Run `app` in `workers` forked uvicorn processes sharing one listening socket.
+
+    `warm` runs in the parent before the first fork, so imported modules,
+    models and loaded indexes are shared copy-on-write by every worker
+    instead of being loaded once each. Workers that die are re-forked from
+    the warm parent; SIGTERM or SIGINT stops them all.
+    """
+    sock = bind_socket(host, port)
+    if warm is not None:
+        warm()
+    # Move everything loaded so far out of the collector's reach, so collections
+    # in the workers do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        global _in_worker
+        pid = os.fork()
+        if pid == 0:
+            _in_worker = True
+            code = 0
+            try:
+                _run_worker(app, sock, log_level)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(f"Serving on {host}:{port} with {workers} workers (parent {os.getpid()})")
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started < RESPAWN_DELAY:
+            time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            spawn()
+    sock.close()
+    logger.info("All workers stopped")